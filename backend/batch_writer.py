@@ -0,0 +1,154 @@
+"""
+Write-behind inserts for the chat WebSocket.
+
+The chat loop acknowledges a message as soon as it has been fanned out and
+hands the documents to be stored (the message and the receiver's
+notification) to this buffer.  A background task writes them with one
+``insert_many`` per collection every ``CHAT_WRITE_INTERVAL_MS`` (or as soon
+as ``CHAT_WRITE_MAX_BATCH`` documents are pending).  Documents carry their
+``_id`` from the start, so a retried batch never stores a document twice.
+On shutdown the running flush is allowed to finish and the rest of the
+buffer is written; a crash loses at most one interval.  While MongoDB is
+unreachable failed batches stay buffered for retry, up to
+``CHAT_WRITE_MAX_PENDING`` documents (the oldest are dropped beyond that).
+
+Callbacks registered with ``on_insert`` run after each stored batch (e.g. to
+bump the unread counters once per batch).
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+from config import CHAT_WRITE_INTERVAL_MS, CHAT_WRITE_MAX_BATCH, CHAT_WRITE_MAX_PENDING
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+class BatchWriter:
+    """Buffers documents per collection until the next flush"""
+
+    def __init__(self, flush_interval_ms: int, max_batch: int, max_pending: int):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._pending: Dict[str, List[dict]] = defaultdict(list)
+        self._pending_count = 0
+        self._flush_lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._db: Any = None
+        self._callbacks: Dict[str, List[Callable[[Any, List[dict]], Awaitable[None]]]] = defaultdict(list)
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+
+    def on_insert(self, collection: str, callback: Callable[[Any, List[dict]], Awaitable[None]]):
+        """Call `callback(db, documents)` after every batch stored in `collection`"""
+        self._callbacks[collection].append(callback)
+
+    def add(self, collection: str, document: dict):
+        self._pending[collection].append(document)
+        self._pending_count += 1
+        self._trim()
+        if self._pending_count >= self.max_batch and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _trim(self):
+        """Drop the oldest documents of the largest backlog while over max_pending"""
+        while self._pending_count > self.max_pending:
+            documents = max(self._pending.values(), key=len)
+            excess = min(len(documents), self._pending_count - self.max_pending)
+            del documents[:excess]
+            self._pending_count -= excess
+            self.dropped += excess
+            logger.error(f"Write buffer full ({self.max_pending} documents), dropped {excess} unwritten documents")
+
+    async def _insert(self, collection: str, documents: List[dict]):
+        try:
+            await self._db[collection].insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            # Documents stored by an earlier, partially failed attempt are fine
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+                raise
+
+    async def flush(self) -> int:
+        """Insert every pending document; collections that fail stay buffered for the next flush"""
+        async with self._flush_lock:
+            if not self._pending_count or self._db is None:
+                return 0
+            pending = self._pending
+            self._pending = defaultdict(list)
+            self._pending_count = 0
+
+            written = 0
+            for collection, documents in pending.items():
+                stored = False
+                try:
+                    await self._insert(collection, documents)
+                    stored = True
+                    written += len(documents)
+                except Exception as e:
+                    self.failed_flushes += 1
+                    logger.error(f"Error writing {len(documents)} {collection} documents (kept for retry): {e}")
+                finally:
+                    # Also on cancellation: an unconfirmed batch goes back in front of newer documents
+                    if not stored:
+                        self._pending[collection][:0] = documents
+                        self._pending_count += len(documents)
+                if not stored:
+                    continue
+                for callback in self._callbacks.get(collection, []):
+                    try:
+                        await callback(self._db, documents)
+                    except Exception as e:
+                        logger.error(f"Error in {collection} insert callback: {e}")
+            self._trim()
+            self.flushes += 1
+            self.written += written
+            return written
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Write buffer flush failed: {e}")
+
+    def start(self, db: Any):
+        self._db = db
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Never cancel mid-write: let the loop finish its flush, then write what is left
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending_documents": self._pending_count,
+            "written_documents": self.written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "dropped_documents": self.dropped
+        }
+
+chat_writer = BatchWriter(CHAT_WRITE_INTERVAL_MS, CHAT_WRITE_MAX_BATCH, CHAT_WRITE_MAX_PENDING)
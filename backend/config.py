@@ -21,3 +21,58 @@ HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", "8000"))
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 
+
+# MongoDB connection pool configuration
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+
+# Seller forecast worker configuration
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", "2"))
+FORECAST_REFRESH_INTERVAL_SECONDS = int(os.getenv("FORECAST_REFRESH_INTERVAL_SECONDS", "3600"))
+
+# Authenticated user cache configuration
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+# Product view/click counter buffer configuration
+COUNTER_FLUSH_INTERVAL_MS = int(os.getenv("COUNTER_FLUSH_INTERVAL_MS", "1000"))
+COUNTER_FLUSH_MAX_EVENTS = int(os.getenv("COUNTER_FLUSH_MAX_EVENTS", "1000"))
+
+# Schema probe refresh interval for the seller dashboards (0 disables background refresh)
+SCHEMA_PROBE_REFRESH_SECONDS = int(os.getenv("SCHEMA_PROBE_REFRESH_SECONDS", "300"))
+
+# Create the declared MongoDB indexes (index_manager.py) when the app starts
+APPLY_INDEXES_ON_STARTUP = os.getenv("APPLY_INDEXES_ON_STARTUP", "true").lower() == "true"
+
+# Stored predictions are reused until their product/seller sales version changes or they
+# are older than this (forecasts cover "the next N days" from when they were computed)
+PREDICTION_CACHE_MAX_AGE_SECONDS = int(os.getenv("PREDICTION_CACHE_MAX_AGE_SECONDS", "86400"))
+
+# WebSocket fan-out: per-connection send queue size and send timeout before a client is dropped
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "5"))
+
+# Pub/sub broker for WebSocket fan-out: memory:// for one process, redis://host:port/db for several workers
+BROKER_URL = os.getenv("BROKER_URL", "memory://")
+BROKER_CHANNEL = os.getenv("BROKER_CHANNEL", "ws:fanout")
+
+# Chat write-behind buffer: flush interval and batch size for message/notification inserts
+CHAT_WRITE_INTERVAL_MS = int(os.getenv("CHAT_WRITE_INTERVAL_MS", "20"))
+CHAT_WRITE_MAX_BATCH = int(os.getenv("CHAT_WRITE_MAX_BATCH", "500"))
+# Documents kept for retry while MongoDB is unreachable; beyond this the oldest are dropped
+CHAT_WRITE_MAX_PENDING = int(os.getenv("CHAT_WRITE_MAX_PENDING", "50000"))
+
+# Server-Sent Events: comment line sent on idle notification streams to keep proxies from closing them
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+# Notifications sent to many users are stored with one insert_many per this many recipients
+NOTIFICATION_FANOUT_CHUNK_SIZE = int(os.getenv("NOTIFICATION_FANOUT_CHUNK_SIZE", "1000"))
+
+# Chatbot LLM API client: connection pool, keep-alive, concurrent completions, timeout and HTTP/2 (needs h2)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "10"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
@@ -0,0 +1,193 @@
+"""
+Chat conversation summaries (``conversations``).
+
+One document per participant pair, keyed by the sorted pair of user ids:
+
+    {
+        "_id": "<a>:<b>", "participants": ["<a>", "<b>"],
+        "last_message": "...", "last_message_id": "...", "last_sender_id": "<a>",
+        "last_timestamp": datetime,
+        "unread": {"<a>": 0, "<b>": 2},
+        "users": {"<a>": {"username": ..., "full_name": ..., "role": ...}, ...}
+    }
+
+Every chat send upserts the pair's document (last message, the receiver's
+unread count, both participants' display info), so the contacts list is one
+indexed query on ``participants`` sorted by ``last_timestamp``.  Display info
+is re-cached by ``refresh_user`` whenever a username, full name or role
+changes.  Rebuild from
+``chat_messages`` with:
+
+    python conversations.py --rebuild
+
+Run the rebuild with the API stopped: messages stored while it runs are
+overwritten when the rebuilt collection is swapped in.
+"""
+import sys
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from index_manager import declare_index, declare_query, replace_collection
+from utils.hydration import fetch_users
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "conversations"
+USER_FIELDS = ("username", "full_name", "role")
+EPOCH = datetime(1970, 1, 1)
+
+MESSAGE_USERS_MAX = 10000
+# Display info of socket messages waiting in the batch writer, by message id
+_message_users: Dict[str, Dict[str, dict]] = {}
+
+declare_index(COLLECTION, [("participants", 1), ("last_timestamp", -1)])
+declare_query("conversations of a user", COLLECTION, {"participants": "000000000000000000000000"}, [("last_timestamp", -1)])
+
+def conversation_id(user_id: Any, other_id: Any) -> str:
+    return ":".join(sorted([str(user_id), str(other_id)]))
+
+def user_summary(user: dict) -> dict:
+    return {field: user.get(field) for field in USER_FIELDS}
+
+def _message_update(message: dict, users: Dict[str, dict]) -> Optional[UpdateOne]:
+    """Pipeline upsert: bump the receiver's unread count, and take the message as the
+    conversation's last one only if it is not older than the stored one (socket
+    messages arrive through the batch writer, after newer REST sends may have landed)"""
+    if not message.get("receiver_id"):
+        return None
+    sender_id, receiver_id = str(message["sender_id"]), str(message["receiver_id"])
+    newer = {"$gte": [message["timestamp"], {"$ifNull": ["$last_timestamp", EPOCH]}]}
+
+    def latest(field: str, value: Any) -> dict:
+        return {"$cond": [newer, {"$literal": value}, f"${field}"]}
+
+    fields = {
+        "participants": {"$literal": sorted([sender_id, receiver_id])},
+        "last_message": latest("last_message", message.get("content")),
+        "last_message_id": latest("last_message_id", str(message["_id"]) if message.get("_id") else None),
+        "last_sender_id": latest("last_sender_id", sender_id),
+        "last_timestamp": latest("last_timestamp", message["timestamp"]),
+        f"unread.{receiver_id}": {"$add": [{"$ifNull": [f"$unread.{receiver_id}", 0]}, 0 if message.get("read") else 1]},
+        f"unread.{sender_id}": {"$ifNull": [f"$unread.{sender_id}", 0]}
+    }
+    for user_id in (sender_id, receiver_id):
+        if user_id in users:
+            fields[f"users.{user_id}"] = {"$literal": user_summary(users[user_id])}
+    return UpdateOne({"_id": conversation_id(sender_id, receiver_id)}, [{"$set": fields}], upsert=True)
+
+async def record_messages(db: Any, messages: Iterable[dict], users: Optional[Dict[str, dict]] = None):
+    """Fold newly stored messages into their conversations (oldest first, so the last one wins).
+
+    `users` optionally maps user ids to user documents whose display info is cached.
+    """
+    users = users or {}
+    operations = [
+        operation for operation in (
+            _message_update(message, users) for message in sorted(messages, key=lambda message: message["timestamp"])
+        ) if operation is not None
+    ]
+    if not operations:
+        return
+    try:
+        await db[COLLECTION].bulk_write(operations, ordered=True)
+    except Exception as e:
+        logger.error(f"Error updating {COLLECTION}: {e}")
+
+def message_users(message_id: Any, users: Dict[str, dict]):
+    """Display info for a message handed to the batch writer, cached on its conversation when it is stored"""
+    _message_users[str(message_id)] = users
+    # Messages the writer dropped are never stored; forget their entries past the cap, oldest first
+    while len(_message_users) > MESSAGE_USERS_MAX:
+        del _message_users[next(iter(_message_users))]
+
+async def messages_added(db: Any, messages: List[dict]):
+    """BatchWriter callback for chat_messages"""
+    users: Dict[str, dict] = {}
+    for message in messages:
+        users.update(_message_users.pop(str(message.get("_id")), {}))
+    await record_messages(db, messages, users)
+
+async def refresh_user(db: Any, user_id: Any, user: Optional[dict] = None):
+    """Re-cache a user's display info on their conversations after the user document changed"""
+    user_id = str(user_id)
+    if user is None:
+        user = (await fetch_users(db, [user_id], list(USER_FIELDS))).get(user_id)
+    if user is None:
+        return
+    try:
+        await db[COLLECTION].update_many({"participants": user_id}, {"$set": {f"users.{user_id}": user_summary(user)}})
+    except Exception as e:
+        logger.error(f"Error refreshing {COLLECTION} display info: {e}")
+
+async def messages_read(db: Any, reader_id: Any, other_id: Any, count: int):
+    """Take messages that just went from unread to read off the reader's count"""
+    if count:
+        await db[COLLECTION].update_one(
+            {"_id": conversation_id(reader_id, other_id)},
+            {"$inc": {f"unread.{reader_id}": -count}}
+        )
+
+async def get_conversations(db: Any, user_id: Any) -> List[dict]:
+    """The user's conversations, most recent first"""
+    return await db[COLLECTION].find({"participants": str(user_id)}).sort("last_timestamp", -1).to_list(length=None)
+
+def other_participant(conversation: dict, user_id: Any) -> str:
+    user_id = str(user_id)
+    return next((participant for participant in conversation["participants"] if participant != user_id), user_id)
+
+def unread_for(conversation: Optional[dict], user_id: Any) -> int:
+    if not conversation:
+        return 0
+    return max(conversation.get("unread", {}).get(str(user_id), 0), 0)
+
+async def rebuild(db: Any) -> int:
+    """Recompute every conversation from chat_messages, with chat writes quiesced (display info is filled from users)"""
+    documents: Dict[str, dict] = {}
+    async for message in db.chat_messages.find({"receiver_id": {"$ne": None}}).sort("timestamp", 1):
+        sender_id, receiver_id = str(message["sender_id"]), str(message["receiver_id"])
+        key = conversation_id(sender_id, receiver_id)
+        document = documents.setdefault(key, {
+            "_id": key,
+            "participants": sorted([sender_id, receiver_id]),
+            "unread": {sender_id: 0, receiver_id: 0},
+            "users": {}
+        })
+        document.update({
+            "last_message": message.get("content"),
+            "last_message_id": str(message["_id"]),
+            "last_sender_id": sender_id,
+            "last_timestamp": message.get("timestamp")
+        })
+        if not message.get("read"):
+            document["unread"][receiver_id] += 1
+
+    users = await fetch_users(db, [participant for document in documents.values() for participant in document["participants"]], list(USER_FIELDS))
+    for document in documents.values():
+        for participant in document["participants"]:
+            if participant in users:
+                document["users"][participant] = user_summary(users[participant])
+
+    await replace_collection(db, COLLECTION, list(documents.values()))
+    logger.info(f"Rebuilt {COLLECTION}: {len(documents)} conversations")
+    return len(documents)
+
+async def main():
+    from database import connect_to_mongo, close_mongo_connection
+
+    logging.basicConfig(level=logging.INFO)
+    db = await connect_to_mongo()
+    try:
+        if "--rebuild" in sys.argv[1:]:
+            count = await rebuild(db)
+            print(f"Rebuilt {COLLECTION}: {count} conversations")
+        else:
+            print("Usage: python conversations.py --rebuild")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
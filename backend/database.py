@@ -0,0 +1,62 @@
+import logging
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from config import (
+    MONGO_URI,
+    DB_NAME,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_MAX_IDLE_TIME_MS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class MongoDB:
+    """Holds the process-wide Motor client and database handle"""
+    client: Optional[AsyncIOMotorClient] = None
+    db: Optional[AsyncIOMotorDatabase] = None
+
+
+mongodb = MongoDB()
+
+
+async def connect_to_mongo():
+    """Create the shared connection pool (called once from the app lifespan)"""
+    if mongodb.client is not None:
+        return mongodb.db
+
+    mongodb.client = AsyncIOMotorClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    )
+    mongodb.db = mongodb.client[DB_NAME]
+    logger.info(f"MongoDB connection pool created (maxPoolSize={MONGO_MAX_POOL_SIZE})")
+    return mongodb.db
+
+
+async def close_mongo_connection():
+    """Close the shared connection pool"""
+    if mongodb.client is not None:
+        mongodb.client.close()
+        logger.info("MongoDB connection pool closed")
+    mongodb.client = None
+    mongodb.db = None
+
+
+def get_database() -> AsyncIOMotorDatabase:
+    """Return the shared database handle for code running outside a request"""
+    if mongodb.db is None:
+        raise RuntimeError("MongoDB is not connected; connect_to_mongo() must run first")
+    return mongodb.db
+
+
+async def get_db() -> AsyncIOMotorDatabase:
+    """FastAPI dependency that injects the shared database handle"""
+    return get_database()
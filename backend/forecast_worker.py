@@ -0,0 +1,224 @@
+"""
+Background forecast engine for seller predictions.
+
+Model fitting (ARIMA / Holt-Winters) is CPU bound, so it runs in a process
+pool instead of on the event loop.  Results are stored per seller and horizon
+in ``seller_forecasts`` together with a data-version stamp taken from the
+seller's ``sales_versions`` counter, which every order write bumps; the prediction endpoints serve the stored
+documents and only refit when that version changes.  Workers are spawned, not
+forked, so they never inherit the running event loop or the Motor client.
+"""
+import asyncio
+import logging
+import multiprocessing
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pymongo import ReplaceOne
+
+from config import FORECAST_WORKERS, FORECAST_REFRESH_INTERVAL_SECONDS
+from utils.sales_versions import get_sales_version
+from index_manager import declare_index
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "seller_forecasts"
+HORIZONS = ("6-month", "1-year", "5-year", "summary")
+
+declare_index(COLLECTION, [("seller_id", 1), ("horizon", 1)], unique=True)
+
+_executor: Optional[ProcessPoolExecutor] = None
+# Entries disappear once no refresh holds or waits for the seller's lock
+_seller_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+_scheduler_task: Optional[asyncio.Task] = None
+
+def start_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=FORECAST_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        logger.info(f"Forecast process pool started ({FORECAST_WORKERS} workers)")
+    return _executor
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        logger.info("Forecast process pool stopped")
+
+def fit_forecasts(records: list) -> dict:
+    """Fit every horizon for one seller's monthly history (runs in a worker process)"""
+    # Imported here so the heavy model code is only loaded inside the workers
+    import json
+    import pandas as pd
+    from routers.sellerprediction import (
+        clean_nan_values,
+        generate_prophet_forecast,
+        generate_arima_forecast,
+        generate_holtwinters_forecast,
+    )
+
+    try:
+        historical_data = pd.DataFrame(records).sort_values('month')
+
+        six_month = generate_prophet_forecast(historical_data, 6)
+        one_year = generate_arima_forecast(historical_data, 12)
+        five_year = generate_holtwinters_forecast(historical_data, 60)
+
+        def to_records(forecast):
+            return clean_nan_values(json.loads(forecast.to_json(orient='records', date_format='iso')))
+
+        # Average monthly order count and units sold drive the projected totals
+        avg_monthly_orders = historical_data['order_count'].mean()
+        avg_monthly_units = historical_data['units_sold'].mean()
+        growth_factor = 1.5  # Assuming 50% growth over 5 years
+
+        # Check if more than 50% of historical months are $0
+        zero_months_percentage = (historical_data['revenue'] == 0).mean() * 100
+        low_confidence = zero_months_percentage > 50
+
+        first_month, last_month = historical_data['month'].iloc[0], historical_data['month'].iloc[-1]
+
+        summary = {
+            "historical_data": {
+                "date_range": f"{first_month:%B} {first_month.day}, {first_month.year} to {last_month:%B} {last_month.day}, {last_month.year}",
+                "months": len(historical_data),
+                "total_revenue": round(float(historical_data['revenue'].sum()), 2),
+                "zero_revenue_months_percentage": round(float(zero_months_percentage), 2)
+            },
+            "six_month": {
+                "method": "ARIMA",
+                "total_revenue": round(float(six_month['revenue'].sum()), 2),
+                "total_orders": max(1, round(avg_monthly_orders * 6)),
+                "total_units": max(1, round(avg_monthly_units * 6)),
+                "confidence_intervals": True,
+                "confidence_level": "Low" if low_confidence else "Normal",
+                "revenue_growth": 0  # Default value
+            },
+            "one_year": {
+                "method": "ARIMA",
+                "total_revenue": round(float(one_year['revenue'].sum()), 2),
+                "total_orders": max(1, round(avg_monthly_orders * 12)),
+                "total_units": max(1, round(avg_monthly_units * 12)),
+                "constraint": "Forecast ends at April 2026",
+                "confidence_level": "Low" if low_confidence else "Normal"
+            },
+            "five_year": {
+                "method": "Holt-Winters Exponential Smoothing",
+                "total_revenue": round(float(five_year['revenue'].sum()), 2),
+                "total_orders": max(1, round(avg_monthly_orders * 60 * growth_factor)),
+                "total_units": max(1, round(avg_monthly_units * 60 * growth_factor)),
+                "warning": "Highly speculative – Based on historical data patterns.",
+                "confidence_level": "Low" if low_confidence else "Normal"
+            }
+        }
+
+        return {
+            "6-month": {"data": to_records(six_month)},
+            "1-year": {"data": to_records(one_year)},
+            "5-year": {"data": to_records(five_year)},
+            "summary": clean_nan_values(summary)
+        }
+    except Exception as e:
+        # HTTPException does not survive pickling back to the parent, so report plain errors
+        detail = getattr(e, "detail", None) or str(e)
+        return {"error": detail}
+
+async def get_data_version(db: Any, seller_id: str) -> str:
+    """Version of the orders the model is fitted on: the seller's sales version plus the month.
+
+    Every order write that can change the fit (new order, status change,
+    payment) bumps the seller's counter in ``sales_versions``, so this is a
+    single-document read however long the seller's order history is.
+    """
+    version = await get_sales_version(db, "seller", seller_id)
+    # The monthly window the models see moves with the calendar month
+    month = datetime.utcnow().strftime("%Y-%m")
+    return f"{month}:{version}"
+
+async def run_fit(records: list) -> dict:
+    """Run fit_forecasts in the process pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(start_executor(), fit_forecasts, records)
+
+async def refresh_seller_forecasts(db: Any, seller_id: str, force: bool = False) -> Dict[str, dict]:
+    """Refit and store all horizons for a seller when its data version has changed"""
+    # Imported lazily to avoid a circular import with the prediction router
+    from routers.sellerprediction import get_historical_sales_data
+
+    lock = _seller_locks.get(seller_id)
+    if lock is None:
+        lock = _seller_locks[seller_id] = asyncio.Lock()
+    async with lock:
+        data_version = await get_data_version(db, seller_id)
+
+        if not force:
+            stored = await db[COLLECTION].find(
+                {"seller_id": seller_id, "data_version": data_version}
+            ).to_list(length=None)
+            if len(stored) == len(HORIZONS):
+                return {doc["horizon"]: doc for doc in stored}
+
+        historical_data = await get_historical_sales_data(db, seller_id)
+        results = await run_fit(historical_data.to_dict("records"))
+        if "error" in results:
+            raise RuntimeError(results["error"])
+
+        generated_at = datetime.utcnow()
+        documents = {
+            horizon: {
+                "seller_id": seller_id,
+                "horizon": horizon,
+                "data_version": data_version,
+                "generated_at": generated_at,
+                "payload": results[horizon]
+            }
+            for horizon in HORIZONS
+        }
+        await db[COLLECTION].bulk_write([
+            ReplaceOne({"seller_id": seller_id, "horizon": horizon}, document, upsert=True)
+            for horizon, document in documents.items()
+        ], ordered=False)
+
+        logger.info(f"Stored forecasts for seller {seller_id} (version {data_version})")
+        return documents
+
+async def get_forecast(db: Any, seller_id: str, horizon: str) -> dict:
+    """Stored forecast for a seller/horizon, refitting first if the data changed"""
+    documents = await refresh_seller_forecasts(db, seller_id)
+    return documents[horizon]
+
+async def refresh_all_sellers(db: Any):
+    """Refresh forecasts for every seller whose sales data changed"""
+    async for seller in db.users.find({"role": "seller"}, {"_id": 1}):
+        seller_id = str(seller["_id"])
+        try:
+            await refresh_seller_forecasts(db, seller_id)
+        except Exception as e:
+            logger.warning(f"Skipping forecast refresh for seller {seller_id}: {e}")
+
+async def _scheduler_loop(db: Any, interval: int):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_all_sellers(db)
+        except Exception as e:
+            logger.error(f"Scheduled forecast refresh failed: {e}")
+
+def start_scheduler(db: Any):
+    """Start the periodic refresh (disabled when FORECAST_REFRESH_INTERVAL_SECONDS is 0)"""
+    global _scheduler_task
+    if FORECAST_REFRESH_INTERVAL_SECONDS > 0 and _scheduler_task is None:
+        _scheduler_task = asyncio.create_task(_scheduler_loop(db, FORECAST_REFRESH_INTERVAL_SECONDS))
+
+async def stop_scheduler():
+    global _scheduler_task
+    if _scheduler_task is not None:
+        _scheduler_task.cancel()
+        try:
+            await _scheduler_task
+        except asyncio.CancelledError:
+            pass
+        _scheduler_task = None
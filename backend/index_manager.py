@@ -0,0 +1,193 @@
+"""
+Declared MongoDB indexes and a COLLSCAN report for representative queries.
+
+Modules declare the indexes their queries need next to the code that runs
+them (``declare_index``), together with a sample of each hot query shape
+(``declare_query``).  ``apply_indexes`` creates every declared index; it is
+idempotent and runs at startup.  From the command line:
+
+    python index_manager.py --apply     # create missing indexes
+    python index_manager.py --report    # explain() the query catalog, flag COLLSCANs
+"""
+import sys
+import asyncio
+import importlib
+import logging
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Modules holding declarations; imported so the registry is complete outside the app (CLI)
+INDEX_MODULES = (
+    "routers.users",
+    "routers.products",
+    "routers.orders",
+    "routers.notifications",
+    "routers.chat",
+    "routers.promotions",
+    "routers.review_api",
+    "routers.predictions",
+    "routers.statistics",
+    "sales_rollup",
+    "forecast_worker",
+    "product_counters",
+    "conversations",
+    "utils.product_search",
+)
+
+class IndexSpec(NamedTuple):
+    collection: str
+    keys: tuple
+    options: dict
+
+class QuerySpec(NamedTuple):
+    name: str
+    collection: str
+    filter: dict
+    sort: Optional[tuple]
+
+_indexes: Dict[tuple, IndexSpec] = {}
+_queries: Dict[str, QuerySpec] = {}
+
+def declare_index(collection: str, keys: Iterable, **options):
+    """Register an index; `keys` is a field name or a list of (field, direction) pairs"""
+    if isinstance(keys, str):
+        keys = [(keys, 1)]
+    keys = tuple((field, direction) for field, direction in keys)
+    _indexes[(collection, keys)] = IndexSpec(collection, keys, options)
+
+def declare_query(name: str, collection: str, filter: dict, sort: Optional[Iterable] = None):
+    """Register a representative query shape for the COLLSCAN report"""
+    _queries[name] = QuerySpec(name, collection, filter, tuple(sort) if sort else None)
+
+def load_declarations():
+    for module in INDEX_MODULES:
+        importlib.import_module(module)
+
+def declared_indexes(collections: Optional[Iterable[str]] = None) -> List[IndexSpec]:
+    wanted = set(collections) if collections else None
+    return [spec for spec in _indexes.values() if wanted is None or spec.collection in wanted]
+
+async def apply_indexes(db: Any, collections: Optional[Iterable[str]] = None) -> Dict[str, list]:
+    """Create every declared index that is missing; conflicts are reported, not raised"""
+    report = {"created": [], "errors": []}
+    for spec in declared_indexes(collections):
+        try:
+            name = await db[spec.collection].create_index(list(spec.keys), **spec.options)
+            report["created"].append(f"{spec.collection}.{name}")
+        except OperationFailure as e:
+            # e.g. an index on the same keys already exists with other options
+            logger.warning(f"Could not create index {spec.collection} {spec.keys}: {e}")
+            report["errors"].append({"collection": spec.collection, "keys": spec.keys, "error": str(e)})
+
+    logger.info(f"Ensured {len(report['created'])} indexes ({len(report['errors'])} errors)")
+    return report
+
+async def replace_collection(db: Any, collection: str, documents: List[dict], batch_size: int = 1000):
+    """Swap in recomputed contents without an empty window for readers.
+
+    The documents (and the collection's declared indexes) are built in a
+    temporary collection that is then renamed over `collection`.  Incremental
+    writes that reach the live collection after the caller computed
+    `documents` are lost with it, so rebuilds built on this (sales_rollup,
+    conversations, unread_counters) must run with those writes quiesced:
+    during a deploy or maintenance window, with the API stopped.
+    """
+    if not documents:
+        await db[collection].delete_many({})
+        return
+    staging = f"{collection}_rebuild"
+    await db[staging].drop()
+    for i in range(0, len(documents), batch_size):
+        await db[staging].insert_many(documents[i:i + batch_size])
+    for spec in declared_indexes([collection]):
+        await db[staging].create_index(list(spec.keys), **spec.options)
+    await db[staging].rename(collection, dropTarget=True)
+
+def _plan_stages(plan: Optional[dict]) -> List[str]:
+    """Every stage name in a (classic or SBE) winning plan"""
+    if not plan:
+        return []
+    stages = [plan["stage"]] if "stage" in plan else []
+    for key in ("inputStage", "queryPlan", "outerStage", "innerStage"):
+        stages.extend(_plan_stages(plan.get(key)))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+def _plan_indexes(plan: Optional[dict]) -> List[str]:
+    if not plan:
+        return []
+    names = [plan["indexName"]] if "indexName" in plan else []
+    for key in ("inputStage", "queryPlan", "outerStage", "innerStage"):
+        names.extend(_plan_indexes(plan.get(key)))
+    for child in plan.get("inputStages", []):
+        names.extend(_plan_indexes(child))
+    return names
+
+async def explain_queries(db: Any) -> List[dict]:
+    """Explain every declared query and note which ones still scan the whole collection"""
+    results = []
+    for spec in _queries.values():
+        cursor = db[spec.collection].find(spec.filter)
+        if spec.sort:
+            cursor = cursor.sort(list(spec.sort))
+        try:
+            explain = await cursor.limit(50).explain()
+        except OperationFailure as e:
+            results.append({"query": spec.name, "collection": spec.collection, "error": str(e)})
+            continue
+
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        stages = _plan_stages(winning_plan)
+        results.append({
+            "query": spec.name,
+            "collection": spec.collection,
+            "collscan": "COLLSCAN" in stages,
+            "stages": stages,
+            "indexes": _plan_indexes(winning_plan)
+        })
+    return results
+
+async def main():
+    from database import connect_to_mongo, close_mongo_connection
+    # Run as a script this file is __main__; the declaring modules register into the
+    # imported index_manager, so read the registry from there
+    import index_manager as registry
+
+    logging.basicConfig(level=logging.INFO)
+    args = sys.argv[1:]
+    if not {"--apply", "--report"} & set(args):
+        print("Usage: python index_manager.py [--apply] [--report]")
+        return
+
+    registry.load_declarations()
+    db = await connect_to_mongo()
+    try:
+        if "--apply" in args:
+            report = await registry.apply_indexes(db)
+            for name in report["created"]:
+                print(f"ok     {name}")
+            for error in report["errors"]:
+                print(f"error  {error['collection']} {error['keys']}: {error['error']}")
+
+        if "--report" in args:
+            results = await registry.explain_queries(db)
+            for result in results:
+                if "error" in result:
+                    status = "ERROR"
+                elif result["collscan"]:
+                    status = "COLLSCAN"
+                else:
+                    status = "ok"
+                detail = result.get("error") or ", ".join(result["indexes"]) or "-"
+                print(f"{status:<9} {result['collection']:<22} {result['query']:<40} {detail}")
+            scans = [result for result in results if result.get("collscan")]
+            print(f"{len(scans)} of {len(results)} query shapes do a COLLSCAN")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+"""
+Shared HTTP client for the chatbot's LLM API.
+
+One ``httpx.AsyncClient`` per process, opened in the app lifespan: its
+connection pool keeps TLS connections to the API alive between requests
+(HTTP/2 when the ``h2`` package is installed), and a semaphore bounds how many
+completions run at once (``LLM_MAX_CONCURRENCY``) so a burst of chat users
+queues here instead of opening connections without limit.
+
+``stream_completion`` relays an OpenAI-compatible ``stream: true`` response
+(server-sent ``data:`` lines) as content deltas.  The API URL is configurable
+(``GROQ_API_URL``), so the client can be pointed at a local stub server.
+"""
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from config import LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE_CONNECTIONS, LLM_MAX_CONCURRENCY, LLM_TIMEOUT_SECONDS, LLM_HTTP2
+
+logger = logging.getLogger(__name__)
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+class LLMError(Exception):
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"LLM API error {status_code}: {text[:200]}")
+        self.status_code = status_code
+        self.text = text
+
+class LLMClient:
+    def __init__(self, max_connections: int, max_keepalive: int, max_concurrency: int, timeout: float, http2: bool):
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.timeout = timeout
+        self.http2 = http2
+        self.max_concurrency = max_concurrency
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.requests = 0
+        self.failures = 0
+        self.in_flight = 0
+
+    def start(self):
+        if self._client is not None:
+            return
+        http2 = self.http2 and _http2_available()
+        if self.http2 and not http2:
+            logger.info("h2 is not installed, the LLM client uses HTTP/1.1 keep-alive")
+        self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits, http2=http2)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def stop(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Opened on first use outside the app (scripts, tests)
+        if self._client is None:
+            self.start()
+        return self._client
+
+    @asynccontextmanager
+    async def _slot(self):
+        client = self.client
+        async with self._semaphore:
+            self.in_flight += 1
+            self.requests += 1
+            try:
+                yield client
+            except Exception:
+                self.failures += 1
+                raise
+            finally:
+                self.in_flight -= 1
+
+    async def post(self, url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> httpx.Response:
+        async with self._slot() as client:
+            return await client.post(url, json=payload, headers=headers)
+
+    async def stream_completion(self, url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> AsyncIterator[str]:
+        """Yield the content deltas of a streamed chat completion; raises LLMError for a non-200 answer"""
+        async with self._slot() as client:
+            async with client.stream("POST", url, json={**payload, "stream": True}, headers=headers) as response:
+                if response.status_code != 200:
+                    text = (await response.aread()).decode(errors="replace")
+                    raise LLMError(response.status_code, text)
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices") or [{}]
+                    content = choices[0].get("delta", {}).get("content")
+                    if content:
+                        yield content
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "open": self._client is not None,
+            "http2": bool(self._client is not None and self.http2 and _http2_available()),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures
+        }
+
+llm_client = LLMClient(LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE_CONNECTIONS, LLM_MAX_CONCURRENCY, LLM_TIMEOUT_SECONDS, LLM_HTTP2)
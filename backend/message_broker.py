@@ -0,0 +1,125 @@
+"""
+Pub/sub backbone for WebSocket fan-out across processes.
+
+Each process only holds its own sockets, so chat messages and notifications
+are published to a broker and every process delivers them to the sockets it
+holds.  ``BROKER_URL`` picks the backend:
+
+- ``memory://`` (default): in-process delivery, for a single worker.  Several
+  subscribers can share one ``InMemoryBroker``, which stands in for separate
+  workers in local tests.
+- ``redis://host:port/db``: Redis pub/sub on ``BROKER_CHANNEL``, for running
+  several uvicorn/gunicorn workers or hosts.
+"""
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from config import BROKER_URL, BROKER_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+class Broker(ABC):
+    """Delivers every published envelope to every subscribed process (including the publisher)"""
+
+    @abstractmethod
+    async def subscribe(self, handler: Handler):
+        ...
+
+    @abstractmethod
+    async def unsubscribe(self, handler: Handler):
+        ...
+
+    @abstractmethod
+    async def publish(self, envelope: Dict[str, Any]):
+        ...
+
+    async def close(self):
+        pass
+
+class InMemoryBroker(Broker):
+    def __init__(self):
+        self._handlers: Set[Handler] = set()
+
+    async def subscribe(self, handler: Handler):
+        self._handlers.add(handler)
+
+    async def unsubscribe(self, handler: Handler):
+        self._handlers.discard(handler)
+
+    async def publish(self, envelope: Dict[str, Any]):
+        for handler in list(self._handlers):
+            try:
+                await handler(envelope)
+            except Exception as e:
+                logger.error(f"Broker handler failed: {e}")
+
+class RedisBroker(Broker):
+    RECONNECT_DELAY_SECONDS = 1.0
+
+    def __init__(self, url: str, channel: str = BROKER_CHANNEL):
+        # redis is only needed when this backend is configured
+        import redis.asyncio as aioredis
+
+        self.channel = channel
+        self._redis = aioredis.from_url(url)
+        self._handlers: Set[Handler] = set()
+        self._reader: Optional[asyncio.Task] = None
+
+    async def subscribe(self, handler: Handler):
+        self._handlers.add(handler)
+        if self._reader is None:
+            self._reader = asyncio.create_task(self._read())
+
+    async def unsubscribe(self, handler: Handler):
+        self._handlers.discard(handler)
+
+    async def publish(self, envelope: Dict[str, Any]):
+        await self._redis.publish(self.channel, json.dumps(envelope))
+
+    async def _read(self):
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    envelope = json.loads(message["data"])
+                    for handler in list(self._handlers):
+                        try:
+                            await handler(envelope)
+                        except Exception as e:
+                            logger.error(f"Broker handler failed: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Messages published while disconnected are lost, as with any Redis pub/sub consumer
+                logger.error(f"Redis broker connection lost, resubscribing: {e}")
+                await asyncio.sleep(self.RECONNECT_DELAY_SECONDS)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+        await self._redis.close()
+
+def create_broker(url: str = BROKER_URL) -> Broker:
+    if url.startswith("memory://"):
+        return InMemoryBroker()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBroker(url)
+    raise ValueError(f"Unsupported BROKER_URL: {url}")
@@ -0,0 +1,163 @@
+"""
+Notification dispatch: persist and push in one step.
+
+``notify`` stores a notification (keeping the unread counters in step, see
+``unread_counters.py``) and pushes it to the recipient's open WebSocket and
+SSE connections through the connection manager, on every worker.  Pushing is
+best effort: the notification is stored either way and still shows up in
+``/notifications``.
+
+Every stored notification has one recipient, so the read path is a plain
+indexed ``user_id`` query.  A notification created without a ``user_id``
+("for the superadmins") is fanned out to one copy per superadmin, and
+``fan_out`` sends one notification to any number of users with chunked
+``insert_many`` calls, each chunk pushed as one published message.
+Broadcasts stored by older versions as ``user_id: None`` are expanded once,
+as a deploy step (db_migration also runs it), never from the app's startup
+where every worker would copy them:
+
+    python notification_dispatch.py --expand-broadcasts
+"""
+import sys
+import time
+import hashlib
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+import unread_counters
+from unread_counters import insert_notification, insert_notifications
+from websocket_manager import manager
+from config import NOTIFICATION_FANOUT_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Superadmin ids are looked up for every admin notification; they rarely change
+SUPERADMIN_IDS_TTL_SECONDS = 60
+_superadmin_ids: List[str] = []
+_superadmin_ids_loaded_at = 0.0
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {key: _json_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_json_value(item) for item in value]
+    return value
+
+def notification_payload(notification: Dict[str, Any]) -> Dict[str, Any]:
+    """The notification as clients receive it from /notifications (string ids, ISO timestamps)"""
+    return _json_value(notification)
+
+async def push(notification: Dict[str, Any]):
+    try:
+        await manager.broadcast_notification(notification_payload(notification))
+    except Exception as e:
+        logger.error(f"Error pushing notification: {e}")
+
+async def push_many(notifications: List[Dict[str, Any]]):
+    """Push addressed notifications with a single publish"""
+    try:
+        await manager.broadcast_notifications([notification_payload(notification) for notification in notifications])
+    except Exception as e:
+        logger.error(f"Error pushing notifications: {e}")
+
+async def superadmin_ids(db: Any) -> List[str]:
+    global _superadmin_ids, _superadmin_ids_loaded_at
+    if time.monotonic() - _superadmin_ids_loaded_at > SUPERADMIN_IDS_TTL_SECONDS:
+        users = await db.users.find({"role": "superadmin"}, {"_id": 1}).to_list(length=None)
+        _superadmin_ids = [str(user["_id"]) for user in users]
+        _superadmin_ids_loaded_at = time.monotonic()
+    return _superadmin_ids
+
+def addressed_to(notification: Dict[str, Any], recipient_ids: Iterable[Any]) -> List[Dict[str, Any]]:
+    """One copy of the notification per (distinct) recipient, each with its own _id"""
+    return [
+        {**notification, "_id": ObjectId(), "user_id": recipient_id}
+        for recipient_id in dict.fromkeys(str(recipient_id) for recipient_id in recipient_ids)
+    ]
+
+async def address(db: Any, notification: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The documents to store for a notification: itself, or a copy per superadmin when it has no user_id"""
+    if notification.get("user_id"):
+        return [notification]
+    return addressed_to(notification, await superadmin_ids(db))
+
+async def _store(db: Any, notifications: List[Dict[str, Any]], chunk_size: int) -> int:
+    for start in range(0, len(notifications), chunk_size):
+        chunk = notifications[start:start + chunk_size]
+        await insert_notifications(db, chunk)
+        await push_many(chunk)
+    return len(notifications)
+
+async def notify(db: Any, notification: Dict[str, Any]) -> int:
+    """Store a notification and push it to its recipients' live connections; returns how many were stored"""
+    if notification.get("user_id"):
+        await insert_notification(db, notification)
+        await push(notification)
+        return 1
+    return await _store(db, await address(db, notification), NOTIFICATION_FANOUT_CHUNK_SIZE)
+
+async def notify_many(db: Any, notifications: List[Dict[str, Any]]) -> int:
+    documents = []
+    for notification in notifications:
+        documents.extend(await address(db, notification))
+    return await _store(db, documents, NOTIFICATION_FANOUT_CHUNK_SIZE)
+
+async def fan_out(db: Any, recipient_ids: Iterable[Any], notification: Dict[str, Any],
+                  chunk_size: int = NOTIFICATION_FANOUT_CHUNK_SIZE) -> int:
+    """Send one notification to many users: a copy per recipient, stored with one insert_many per chunk"""
+    return await _store(db, addressed_to(notification, recipient_ids), chunk_size)
+
+def copy_id(broadcast_id: ObjectId, recipient_id: str) -> ObjectId:
+    """Deterministic id for a recipient's copy of a broadcast (keeps the broadcast's timestamp bytes)"""
+    digest = hashlib.sha1(f"{broadcast_id}:{recipient_id}".encode()).digest()
+    return ObjectId(broadcast_id.binary[:4] + digest[:8])
+
+async def expand_broadcasts(db: Any, chunk_size: int = NOTIFICATION_FANOUT_CHUNK_SIZE) -> int:
+    """Replace notifications stored with user_id None by a copy per superadmin (read state kept)"""
+    broadcasts = await db.notifications.find({"user_id": None}).to_list(length=None)
+    if not broadcasts:
+        return 0
+    recipients = await superadmin_ids(db)
+    if not recipients:
+        logger.warning("No superadmins to expand broadcast notifications to")
+        return 0
+    # Upserted under ids derived from (broadcast, recipient): re-running after a crash rewrites the same copies
+    copies = [
+        {**copy, "_id": copy_id(broadcast["_id"], copy["user_id"])}
+        for broadcast in broadcasts for copy in addressed_to(broadcast, recipients)
+    ]
+    for start in range(0, len(copies), chunk_size):
+        await db.notifications.bulk_write([
+            ReplaceOne({"_id": copy["_id"]}, copy, upsert=True) for copy in copies[start:start + chunk_size]
+        ], ordered=False)
+    await db.notifications.delete_many({"_id": {"$in": [broadcast["_id"] for broadcast in broadcasts]}})
+    # Copies were written directly, so recount instead of adjusting
+    await unread_counters.rebuild(db)
+    logger.info(f"Expanded {len(broadcasts)} superadmin broadcasts into {len(copies)} notifications")
+    return len(broadcasts)
+
+async def main():
+    from database import connect_to_mongo, close_mongo_connection
+
+    logging.basicConfig(level=logging.INFO)
+    db = await connect_to_mongo()
+    try:
+        if "--expand-broadcasts" in sys.argv[1:]:
+            count = await expand_broadcasts(db)
+            print(f"Expanded {count} broadcast notifications")
+        else:
+            print("Usage: python notification_dispatch.py --expand-broadcasts")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,204 @@
+"""
+Write-behind buffer for product view and click counters.
+
+The tracking endpoints only bump in-memory counters; a background task
+coalesces them per product and flushes them with one ``bulk_write`` every
+``COUNTER_FLUSH_INTERVAL_MS`` (or as soon as ``COUNTER_FLUSH_MAX_EVENTS``
+events are pending).  Each flush also updates the per-day time series in
+``product_daily_stats``.  When a write fails only the increments MongoDB did
+not apply are kept for the next flush, so nothing is counted twice.  On
+shutdown the running flush finishes and the rest is written; a crash loses at
+most one interval of events.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from config import COUNTER_FLUSH_INTERVAL_MS, COUNTER_FLUSH_MAX_EVENTS
+from sales_rollup import day_bucket
+from index_manager import declare_index
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "product_daily_stats"
+FIELDS = {"views_count": "views", "clicks_count": "clicks"}
+
+declare_index(COLLECTION, [("product_id", 1), ("day", 1)], unique=True)
+
+def _counter_map() -> dict:
+    return defaultdict(lambda: defaultdict(int))
+
+def _merge(target: dict, increments: dict):
+    for key, fields in increments.items():
+        for field, amount in fields.items():
+            target[key][field] += amount
+
+class CounterBuffer:
+    """Coalesces counter increments per product and day until the next flush"""
+
+    def __init__(self, flush_interval_ms: int, max_events: int):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_events = max_events
+        self._pending: Dict[Tuple[str, datetime], Dict[str, int]] = _counter_map()
+        self._pending_events = 0
+        # Increments a failed flush did not apply, per product and per (product, day)
+        self._retry_totals: Dict[str, Dict[str, int]] = _counter_map()
+        self._retry_daily: Dict[Tuple[str, datetime], Dict[str, int]] = _counter_map()
+        self._stopping = False
+        self._flush_lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._db: Any = None
+        self.flushed_events = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    def add(self, product_id: str, field: str, amount: int = 1):
+        if field not in FIELDS:
+            raise ValueError(f"Unknown counter field: {field}")
+        self._pending[(product_id, day_bucket(datetime.utcnow()))][field] += amount
+        self._pending_events += amount
+        if self._pending_events >= self.max_events and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _take(self) -> Tuple[dict, int]:
+        pending, events = self._pending, self._pending_events
+        self._pending = _counter_map()
+        self._pending_events = 0
+        return pending, events
+
+    def _restore(self, pending: dict, events: int):
+        _merge(self._pending, pending)
+        self._pending_events += events
+
+    async def flush(self) -> int:
+        """Write every pending increment; increments that were not applied are retried by the next flush"""
+        async with self._flush_lock:
+            if self._db is None or not (self._pending or self._retry_totals or self._retry_daily):
+                return 0
+            pending, events = self._take()
+            try:
+                pending = await self._known_products(pending)
+            except Exception as e:
+                # Nothing was written yet
+                self.failed_flushes += 1
+                self._restore(pending, events)
+                logger.error(f"Error flushing product counters ({events} events kept for retry): {e}")
+                return 0
+
+            totals, self._retry_totals = self._retry_totals, _counter_map()
+            daily, self._retry_daily = self._retry_daily, _counter_map()
+            for (product_id, day), fields in pending.items():
+                _merge(totals, {product_id: fields})
+                _merge(daily, {(product_id, day): fields})
+
+            unapplied_totals, unapplied_daily = totals, daily
+            try:
+                unapplied_totals = await self._apply(
+                    self._db.products, totals,
+                    lambda product_id: {"_id": ObjectId(product_id)},
+                    lambda fields: dict(fields), upsert=False
+                )
+                unapplied_daily = await self._apply(
+                    self._db[COLLECTION], daily,
+                    lambda key: {"product_id": key[0], "day": key[1]},
+                    lambda fields: {FIELDS[field]: amount for field, amount in fields.items()}, upsert=True
+                )
+            except Exception as e:
+                logger.error(f"Error flushing product counters (kept for retry): {e}")
+            finally:
+                # Only what was not applied goes back (also if the flush is interrupted)
+                _merge(self._retry_totals, unapplied_totals)
+                _merge(self._retry_daily, unapplied_daily)
+
+            if unapplied_totals or unapplied_daily:
+                self.failed_flushes += 1
+                return 0
+            self.flushes += 1
+            self.flushed_events += events
+            return events
+
+    async def _known_products(self, pending: dict) -> dict:
+        """Drop events for ids that are not products so junk ids don't create time series rows"""
+        if not pending:
+            return pending
+        product_ids = {ObjectId(product_id) for product_id, _ in pending}
+        existing = {
+            str(doc["_id"])
+            for doc in await self._db.products.find({"_id": {"$in": list(product_ids)}}, {"_id": 1}).to_list(length=None)
+        }
+        return {key: fields for key, fields in pending.items() if key[0] in existing}
+
+    @staticmethod
+    async def _apply(collection: Any, increments: dict, filter_for: Callable, inc_for: Callable, upsert: bool) -> dict:
+        """One unordered bulk_write of $inc's; returns the increments that were not applied"""
+        if not increments:
+            return {}
+        keys = list(increments)
+        try:
+            await collection.bulk_write([
+                UpdateOne(filter_for(key), {"$inc": inc_for(increments[key])}, upsert=upsert)
+                for key in keys
+            ], ordered=False)
+        except BulkWriteError as e:
+            # The other operations of the unordered batch were applied; retrying them would count twice
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            return {keys[index]: increments[keys[index]] for index in failed}
+        return {}
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Product counter flush failed: {e}")
+
+    def start(self, db: Any):
+        self._db = db
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Never cancel mid-flush: let the loop finish its current write, then flush the rest
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        # Whatever is still buffered is written before the connection closes
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending_events": self._pending_events,
+            "retrying_products": len(self._retry_totals),
+            "flushed_events": self.flushed_events,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes
+        }
+
+product_counters = CounterBuffer(COUNTER_FLUSH_INTERVAL_MS, COUNTER_FLUSH_MAX_EVENTS)
+
+def record_event(product_id: str, field: str):
+    """Buffer one view/click for a product (written by the next flush)"""
+    product_counters.add(product_id, field)
+
+async def get_daily_stats(db: Any, product_id: str, start: Optional[datetime] = None) -> list:
+    """Per-day views/clicks of a product, oldest first"""
+    query = {"product_id": product_id}
+    if start:
+        query["day"] = {"$gte": day_bucket(start)}
+    return await db[COLLECTION].find(query, {"_id": 0}).sort("day", 1).to_list(length=None)
\ No newline at end of file
@@ -3,22 +3,22 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime
 from bson import ObjectId
 import os
-from pymongo import MongoClient
 
 # Import from users.py
 from .users import get_current_user, get_current_active_user
-
-# MongoDB connection
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-client = MongoClient(MONGO_URI)
-db = client["ecommerce_db"]
+from database import get_db
+from index_manager import declare_index, declare_query
 
 router = APIRouter()
 
+declare_index("promotions", "code")
+declare_query("promotion by code", "promotions", {"code": "SUMMER10"})
+
 @router.post("/", response_model=Dict[str, Any])
 async def create_promotion(
     promotion_data: Dict[str, Any],
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: Any = Depends(get_db)
 ):
     # Check if user is a seller or superadmin
     if current_user["role"] not in ["seller", "superadmin"]:
@@ -36,7 +36,7 @@ async def create_promotion(
         )
     
     # Check if code already exists
-    existing_promotion = db.promotions.find_one({"code": code})
+    existing_promotion = await db.promotions.find_one({"code": code})
     if existing_promotion:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -62,7 +62,7 @@ async def create_promotion(
         "updated_at": datetime.utcnow()
     }
     
-    result = db.promotions.insert_one(promotion)
+    result = await db.promotions.insert_one(promotion)
     
     # Return created promotion
     promotion["_id"] = str(result.inserted_id)
@@ -75,7 +75,8 @@ async def get_promotions(
     current_user: dict = Depends(get_current_active_user),
     active_only: bool = False,
     skip: int = 0,
-    limit: int = 20
+    limit: int = 20,
+    db: Any = Depends(get_db)
 ):
     # Build query based on user role
     query = {}
@@ -94,12 +95,12 @@ async def get_promotions(
         ]
     
     # Get promotions
-    promotions = list(
+    promotions = await (
         db.promotions.find(query)
         .sort("created_at", -1)
         .skip(skip)
         .limit(limit)
-    )
+    ).to_list(length=None)
     
     # Convert ObjectId to string
     for promotion in promotions:
@@ -115,9 +116,10 @@ async def get_promotions(
 @router.get("/{promotion_id}", response_model=Dict[str, Any])
 async def get_promotion(
     promotion_id: str,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: Any = Depends(get_db)
 ):
-    promotion = db.promotions.find_one({"_id": ObjectId(promotion_id)})
+    promotion = await db.promotions.find_one({"_id": ObjectId(promotion_id)})
     
     if not promotion:
         raise HTTPException(
@@ -149,9 +151,10 @@ async def get_promotion(
 async def update_promotion(
     promotion_id: str,
     promotion_data: Dict[str, Any],
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: Any = Depends(get_db)
 ):
-    promotion = db.promotions.find_one({"_id": ObjectId(promotion_id)})
+    promotion = await db.promotions.find_one({"_id": ObjectId(promotion_id)})
     
     if not promotion:
         raise HTTPException(
@@ -173,13 +176,13 @@ async def update_promotion(
     update_data = {k: v for k, v in promotion_data.items() if k != "_id" and k != "seller_id"}
     update_data["updated_at"] = datetime.utcnow()
     
-    db.promotions.update_one(
+    await db.promotions.update_one(
         {"_id": ObjectId(promotion_id)},
         {"$set": update_data}
     )
     
     # Get updated promotion
-    updated_promotion = db.promotions.find_one({"_id": ObjectId(promotion_id)})
+    updated_promotion = await db.promotions.find_one({"_id": ObjectId(promotion_id)})
     updated_promotion["_id"] = str(updated_promotion["_id"])
     updated_promotion["seller_id"] = str(updated_promotion["seller_id"])
     
@@ -192,9 +195,10 @@ async def update_promotion(
 @router.delete("/{promotion_id}", response_model=Dict[str, str])
 async def delete_promotion(
     promotion_id: str,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: Any = Depends(get_db)
 ):
-    promotion = db.promotions.find_one({"_id": ObjectId(promotion_id)})
+    promotion = await db.promotions.find_one({"_id": ObjectId(promotion_id)})
     
     if not promotion:
         raise HTTPException(
@@ -213,14 +217,15 @@ async def delete_promotion(
         )
     
     # Delete promotion
-    db.promotions.delete_one({"_id": ObjectId(promotion_id)})
+    await db.promotions.delete_one({"_id": ObjectId(promotion_id)})
     
     return {"message": "Promotion deleted successfully"}
 
 @router.post("/validate", response_model=Dict[str, Any])
 async def validate_promotion_code(
     validation_data: Dict[str, Any],
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: Any = Depends(get_db)
 ):
     code = validation_data.get("code")
     if not code:
@@ -230,7 +235,7 @@ async def validate_promotion_code(
         )
     
     # Get promotion by code
-    promotion = db.promotions.find_one({"code": code})
+    promotion = await db.promotions.find_one({"code": code})
     
     if not promotion:
         raise HTTPException(
@@ -2,12 +2,17 @@ from fastapi import APIRouter, Body, HTTPException, Depends
 from typing import Dict, Any
 from models.Review import ReviewModel, create_review, get_review, update_review, delete_review, list_reviews
 from .users import get_current_user
+from database import get_db
+from index_manager import declare_index, declare_query
 from bson import ObjectId
 
 router = APIRouter()
 
+declare_index("reviews", "product_id")
+declare_query("product reviews", "reviews", {"product_id": "000000000000000000000000"})
+
 @router.post("/", response_description="Add new review")
-async def add_review(review: ReviewModel = Body(...), current_user: dict = Depends(get_current_user)):
+async def add_review(review: ReviewModel = Body(...), current_user: dict = Depends(get_current_user), db: Any = Depends(get_db)):
     try:
         # Ensure the user is providing a review for a product
         if not review.product_id:
@@ -18,15 +23,15 @@ async def add_review(review: ReviewModel = Body(...), current_user: dict = Depen
         review.user_name = current_user["username"]
         review.user_avatar = current_user.get("avatar_url")  # Optional avatar URL
 
-        review_id = create_review(review)
+        review_id = await create_review(db, review)
         return {"message": "Review added successfully", "review_id": review_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{id}", response_description="Get a single review")
-async def show_review(id: str):
+async def show_review(id: str, db: Any = Depends(get_db)):
     try:
-        review = get_review(id)
+        review = await get_review(db, id)
         if review:
             return review
         raise HTTPException(status_code=404, detail=f"Review with id {id} not found")
@@ -34,9 +39,9 @@ async def show_review(id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/{id}", response_description="Update a review")
-async def update_review_data(id: str, review: ReviewModel = Body(...), current_user: dict = Depends(get_current_user)):
+async def update_review_data(id: str, review: ReviewModel = Body(...), current_user: dict = Depends(get_current_user), db: Any = Depends(get_db)):
     try:
-        existing_review = get_review(id)
+        existing_review = await get_review(db, id)
         if not existing_review:
             raise HTTPException(status_code=404, detail=f"Review with id {id} not found")
 
@@ -46,7 +51,7 @@ async def update_review_data(id: str, review: ReviewModel = Body(...), current_u
                 status_code=403, detail="Not authorized to update this review"
             )
 
-        updated_review = update_review(id, review)
+        updated_review = await update_review(db, id, review)
         if updated_review:
             return {"message": "Review updated successfully", "review": updated_review}
         raise HTTPException(status_code=404, detail=f"Review with id {id} not found")
@@ -55,7 +60,7 @@ async def update_review_data(id: str, review: ReviewModel = Body(...), current_u
 
 # Fixed verify endpoint with proper ObjectId handling
 @router.put("/{id}/verify", response_description="Verify or unverify a review")
-async def verify_review(id: str, data: Dict[str, Any] = Body(...), current_user: dict = Depends(get_current_user)):
+async def verify_review(id: str, data: Dict[str, Any] = Body(...), current_user: dict = Depends(get_current_user), db: Any = Depends(get_db)):
     try:
         # Check if the current user is a seller or admin
         if current_user["role"] not in ["seller", "admin", "superadmin"]:
@@ -63,7 +68,7 @@ async def verify_review(id: str, data: Dict[str, Any] = Body(...), current_user:
                 status_code=403, detail="Not authorized to verify reviews"
             )
         
-        existing_review = get_review(id)
+        existing_review = await get_review(db, id)
         if not existing_review:
             raise HTTPException(status_code=404, detail=f"Review with id {id} not found")
         
@@ -71,14 +76,13 @@ async def verify_review(id: str, data: Dict[str, Any] = Body(...), current_user:
         verified_status = data.get("verified", False)
         
         # Update only the verified field in the database directly
-        db = update_review.__globals__['db']  # Get the db from the update_review function
-        db.reviews.update_one(
+        await db.reviews.update_one(
             {"_id": ObjectId(id)}, 
             {"$set": {"verified": verified_status}}
         )
         
         # Get the updated review
-        updated_review = get_review(id)
+        updated_review = await get_review(db, id)
         
         if updated_review:
             # Convert ObjectId to string for JSON serialization
@@ -107,9 +111,9 @@ async def verify_review(id: str, data: Dict[str, Any] = Body(...), current_user:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{id}", response_description="Delete a review")
-async def delete_review_data(id: str, current_user: dict = Depends(get_current_user)):
+async def delete_review_data(id: str, current_user: dict = Depends(get_current_user), db: Any = Depends(get_db)):
     try:
-        existing_review = get_review(id)
+        existing_review = await get_review(db, id)
         if not existing_review:
             raise HTTPException(status_code=404, detail=f"Review with id {id} not found")
 
@@ -119,16 +123,16 @@ async def delete_review_data(id: str, current_user: dict = Depends(get_current_u
                 status_code=403, detail="Not authorized to delete this review"
             )
 
-        if delete_review(id):
+        if await delete_review(db, id):
             return {"message": "Review deleted successfully"}
         raise HTTPException(status_code=404, detail=f"Review with id {id} not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/product/{product_id}", response_description="List reviews for a product")
-async def list_product_reviews(product_id: str):
+async def list_product_reviews(product_id: str, db: Any = Depends(get_db)):
     try:
-        reviews = list_reviews(product_id)
+        reviews = await list_reviews(db, product_id)
         # Convert ObjectId to string
         for review in reviews:
             review["id"] = str(review.pop("_id"))
@@ -3,22 +3,20 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime
 from bson import ObjectId
 import os
-from pymongo import MongoClient
 
 # Import from users.py
 from .users import get_current_user, get_current_active_user
-
-# MongoDB connection
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-client = MongoClient(MONGO_URI)
-db = client["ecommerce_db"]
+from database import get_db
+from utils.user_cache import invalidate_user
+from notification_dispatch import notify
 
 router = APIRouter()
 
 @router.post("/request", response_model=Dict[str, Any])
 async def request_payout(
     payout_data: Dict[str, Any],
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: Any = Depends(get_db)
 ):
     # Check if user is a seller
     if current_user["role"] != "seller":
@@ -36,7 +34,7 @@ async def request_payout(
         )
     
     # Check if seller has enough balance
-    seller = db.users.find_one({"_id": ObjectId(current_user["_id"])})
+    seller = await db.users.find_one({"_id": ObjectId(current_user["_id"])})
     if not seller:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -61,13 +59,14 @@ async def request_payout(
         "updated_at": datetime.utcnow()
     }
     
-    result = db.payout_requests.insert_one(payout_request)
+    result = await db.payout_requests.insert_one(payout_request)
     
     # Reduce seller balance temporarily
-    db.users.update_one(
+    await db.users.update_one(
         {"_id": ObjectId(current_user["_id"])},
         {"$inc": {"balance": -amount}}
     )
+    invalidate_user(current_user["_id"])
     
     # Create notification for superadmin
     notification = {
@@ -79,7 +78,7 @@ async def request_payout(
         "created_at": datetime.utcnow()
     }
     
-    db.notifications.insert_one(notification)
+    await notify(db, notification)
     
     # Return payout request
     payout_request["_id"] = str(result.inserted_id)
@@ -92,7 +91,8 @@ async def get_payout_requests(
     current_user: dict = Depends(get_current_active_user),
     status: Optional[str] = None,
     skip: int = 0,
-    limit: int = 20
+    limit: int = 20,
+    db: Any = Depends(get_db)
 ):
     # Build query based on user role
     if current_user["role"] == "seller":
@@ -109,12 +109,12 @@ async def get_payout_requests(
         query["status"] = status
     
     # Get payout requests
-    payout_requests = list(
+    payout_requests = await (
         db.payout_requests.find(query)
         .sort("created_at", -1)
         .skip(skip)
         .limit(limit)
-    )
+    ).to_list(length=None)
     
     # Convert ObjectId to string
     for request in payout_requests:
@@ -129,7 +129,8 @@ async def get_payout_requests(
 async def process_payout_request(
     request_id: str,
     process_data: Dict[str, Any],
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: Any = Depends(get_db)
 ):
     # Only superadmin can process payouts
     if current_user["role"] != "superadmin":
@@ -139,7 +140,7 @@ async def process_payout_request(
         )
     
     # Get payout request
-    payout_request = db.payout_requests.find_one({"_id": ObjectId(request_id)})
+    payout_request = await db.payout_requests.find_one({"_id": ObjectId(request_id)})
     if not payout_request:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -170,17 +171,18 @@ async def process_payout_request(
         "notes": process_data.get("notes")
     }
     
-    db.payout_requests.update_one(
+    await db.payout_requests.update_one(
         {"_id": ObjectId(request_id)},
         {"$set": update_data}
     )
     
     # If rejected, return funds to seller
     if decision == "rejected":
-        db.users.update_one(
+        await db.users.update_one(
             {"_id": ObjectId(payout_request["seller_id"])},
             {"$inc": {"balance": payout_request["amount"]}}
         )
+        invalidate_user(payout_request["seller_id"])
     
     # Create notification for seller
     notification = {
@@ -192,10 +194,10 @@ async def process_payout_request(
         "created_at": datetime.utcnow()
     }
     
-    db.notifications.insert_one(notification)
+    await notify(db, notification)
     
     # Get updated payout request
-    updated_request = db.payout_requests.find_one({"_id": ObjectId(request_id)})
+    updated_request = await db.payout_requests.find_one({"_id": ObjectId(request_id)})
     updated_request["_id"] = str(updated_request["_id"])
     updated_request["seller_id"] = str(updated_request["seller_id"])
     updated_request["processed_by"] = str(updated_request["processed_by"])
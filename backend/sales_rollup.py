@@ -0,0 +1,202 @@
+"""
+Pre-aggregated seller sales (``seller_daily_sales``).
+
+One document per (seller_id, day, product_id) holding running totals for
+settled orders, so seller statistics read a handful of rows per day instead
+of every order a seller ever received.  Rows with ``product_id: None`` hold
+the seller-level totals for the day (order count, revenue, status counts).
+
+The collection is maintained incrementally from the order/payment write
+paths and can be rebuilt from scratch with:
+
+    python sales_rollup.py --rebuild
+
+Run the rebuild with the API stopped: order writes that land while it runs
+are overwritten when the rebuilt collection is swapped in.
+"""
+import sys
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from database import connect_to_mongo, close_mongo_connection
+from index_manager import declare_index, declare_query, replace_collection
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "seller_daily_sales"
+REBUILD_BATCH_SIZE = 1000
+
+declare_index(COLLECTION, [("seller_id", 1), ("day", 1), ("product_id", 1)], unique=True)
+declare_query("seller daily sales", COLLECTION, {"seller_id": "000000000000000000000000", "product_id": None}, [("day", 1)])
+
+def _to_number(value: Any, cast=float, default=0):
+    try:
+        return cast(value)
+    except (ValueError, TypeError):
+        return default
+
+def day_bucket(value: Optional[datetime]) -> datetime:
+    """Truncate a timestamp to its UTC day (stored naive, like the rest of the data)"""
+    value = value or datetime.utcnow()
+    if value.tzinfo is not None:
+        value = value.replace(tzinfo=None) - (value.utcoffset() or timedelta(0))
+    return datetime(value.year, value.month, value.day)
+
+def is_settled(order: dict) -> bool:
+    """Orders count towards sales once paid; legacy orders without a payment status always count"""
+    return order.get("payment_status", "paid") == "paid"
+
+def build_increments(order: dict, product_sellers: Optional[Dict[str, str]] = None) -> Dict[Tuple, Dict[str, float]]:
+    """Compute the $inc deltas an order contributes to the rollup, keyed by (seller_id, day, product_id)"""
+    product_sellers = product_sellers or {}
+    day = day_bucket(order.get("created_at"))
+    status = order.get("status", "pending")
+    increments: Dict[Tuple, Dict[str, float]] = {}
+    seen_sellers = set()
+
+    for item in order.get("items", []):
+        product_id = str(item["product_id"]) if item.get("product_id") else None
+        seller_id = item.get("seller_id") or product_sellers.get(product_id)
+        if not seller_id:
+            continue
+        seller_id = str(seller_id)
+
+        quantity = _to_number(item.get("quantity", 1), int, 1)
+        revenue = _to_number(item.get("price", 0)) * quantity
+
+        seller_row = increments.setdefault((seller_id, day, None), {"orders": 0, "quantity": 0, "revenue": 0.0})
+        if seller_id not in seen_sellers:
+            seen_sellers.add(seller_id)
+            seller_row["orders"] += 1
+            seller_row[f"status_counts.{status}"] = 1
+        seller_row["quantity"] += quantity
+        seller_row["revenue"] += revenue
+
+        if product_id:
+            product_row = increments.setdefault((seller_id, day, product_id), {"order_lines": 0, "quantity": 0, "revenue": 0.0})
+            product_row["order_lines"] += 1
+            product_row["quantity"] += quantity
+            product_row["revenue"] += revenue
+
+    return increments
+
+async def _apply(db: Any, increments: Dict[Tuple, Dict[str, float]], sign: int = 1):
+    if not increments:
+        return
+    operations = [
+        UpdateOne(
+            {"seller_id": seller_id, "day": day, "product_id": product_id},
+            {"$inc": {field: value * sign for field, value in fields.items()}},
+            upsert=True
+        )
+        for (seller_id, day, product_id), fields in increments.items()
+    ]
+    await db[COLLECTION].bulk_write(operations, ordered=False)
+
+async def record_order(db: Any, order: dict, sign: int = 1):
+    """Add (or with sign=-1 remove) a settled order's contribution; never fails the caller's write"""
+    if not is_settled(order):
+        return
+    try:
+        await _apply(db, build_increments(order), sign)
+    except Exception as e:
+        logger.error(f"Error updating {COLLECTION} for order {order.get('_id')}: {e}")
+
+async def record_status_change(db: Any, order: dict, new_status: str):
+    """Move a settled order between status buckets on its sellers' day rows"""
+    old_status = order.get("status", "pending")
+    if not is_settled(order) or old_status == new_status:
+        return
+    try:
+        day = day_bucket(order.get("created_at"))
+        seller_ids = {str(item["seller_id"]) for item in order.get("items", []) if item.get("seller_id")}
+        operations = [
+            UpdateOne(
+                {"seller_id": seller_id, "day": day, "product_id": None},
+                {"$inc": {f"status_counts.{old_status}": -1, f"status_counts.{new_status}": 1}}
+            )
+            for seller_id in seller_ids
+        ]
+        if operations:
+            await db[COLLECTION].bulk_write(operations, ordered=False)
+    except Exception as e:
+        logger.error(f"Error updating {COLLECTION} status for order {order.get('_id')}: {e}")
+
+async def rebuild(db: Any) -> int:
+    """Recompute the whole rollup from the orders collection (with order writes quiesced)"""
+    # Legacy orders may lack items.seller_id, so resolve it from the product
+    product_sellers = {}
+    async for product in db.products.find({}, {"seller_id": 1}):
+        if product.get("seller_id"):
+            product_sellers[str(product["_id"])] = str(product["seller_id"])
+
+    totals: Dict[Tuple, Dict[str, float]] = {}
+    async for order in db.orders.find({}, {"items": 1, "created_at": 1, "status": 1, "payment_status": 1}):
+        if not is_settled(order):
+            continue
+        for key, fields in build_increments(order, product_sellers).items():
+            row = totals.setdefault(key, {})
+            for field, value in fields.items():
+                row[field] = row.get(field, 0) + value
+
+    documents = []
+    for (seller_id, day, product_id), fields in totals.items():
+        document = {"seller_id": seller_id, "day": day, "product_id": product_id}
+        for field, value in fields.items():
+            if field.startswith("status_counts."):
+                document.setdefault("status_counts", {})[field.split(".", 1)[1]] = value
+            else:
+                document[field] = value
+        documents.append(document)
+
+    # Built aside and renamed into place, so dashboards never read an empty rollup
+    await replace_collection(db, COLLECTION, documents, REBUILD_BATCH_SIZE)
+
+    logger.info(f"Rebuilt {COLLECTION} with {len(documents)} rows")
+    return len(documents)
+
+def _day_range(start: Optional[datetime], end: Optional[datetime]) -> dict:
+    day_match = {}
+    if start:
+        day_match["$gte"] = day_bucket(start)
+    if end:
+        day_match["$lte"] = day_bucket(end)
+    return {"day": day_match} if day_match else {}
+
+async def get_seller_days(db: Any, seller_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> list:
+    """Seller-level rows (one per day with sales), oldest first"""
+    query = {"seller_id": str(seller_id), "product_id": None, **_day_range(start, end)}
+    return await db[COLLECTION].find(query).sort("day", 1).to_list(length=None)
+
+async def get_seller_product_totals(db: Any, seller_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, dict]:
+    """Per-product totals over a date range, keyed by product id"""
+    pipeline = [
+        {"$match": {"seller_id": str(seller_id), "product_id": {"$ne": None}, **_day_range(start, end)}},
+        {"$group": {
+            "_id": "$product_id",
+            "order_lines": {"$sum": "$order_lines"},
+            "quantity": {"$sum": "$quantity"},
+            "revenue": {"$sum": "$revenue"}
+        }}
+    ]
+    rows = await db[COLLECTION].aggregate(pipeline).to_list(length=None)
+    return {row["_id"]: row for row in rows}
+
+async def main():
+    logging.basicConfig(level=logging.INFO)
+    db = await connect_to_mongo()
+    try:
+        if "--rebuild" in sys.argv[1:]:
+            count = await rebuild(db)
+            print(f"Rebuilt {COLLECTION}: {count} rows")
+        else:
+            print("Usage: python sales_rollup.py --rebuild")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+"""
+Cached schema introspection for the seller dashboards.
+
+The seller statistics code adapts to legacy document shapes (seller ids
+stored as strings or ObjectIds, orders with or without ``items.seller_id``,
+payments linked by seller or by order).  Those shape facts used to be
+re-derived from sample documents on every request; this module computes them
+once at startup, refreshes them every ``SCHEMA_PROBE_REFRESH_SECONDS`` and
+serves the cached result as read-only mappings, so requests share it without
+copying.
+"""
+import json
+import asyncio
+import logging
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
+
+from bson import ObjectId
+
+from config import SCHEMA_PROBE_REFRESH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+class _JSONEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        return super().default(obj)
+
+_schema: Optional[Mapping[str, Any]] = None
+_refresh_lock = asyncio.Lock()
+_refresh_task: Optional[asyncio.Task] = None
+
+def _field_facts(document: Optional[dict], fields: tuple) -> dict:
+    """For each field: is it present, and does it hold an ObjectId"""
+    facts = {}
+    for field in fields:
+        value = document.get(field) if document else None
+        facts[f"has_{field}"] = bool(document) and field in document
+        facts[f"{field}_is_object_id"] = isinstance(value, ObjectId)
+    return facts
+
+def _order_facts(order: Optional[dict]) -> dict:
+    items = order.get("items") if order else None
+    has_items = isinstance(items, list)
+    first_item = items[0] if has_items and items else None
+    return {
+        "has_items": has_items,
+        "items_have_seller_id": bool(first_item) and "seller_id" in first_item,
+        "item_seller_id_is_object_id": isinstance((first_item or {}).get("seller_id"), ObjectId),
+        **_field_facts(order, ("seller_id", "seller", "payment_status"))
+    }
+
+def _payment_facts(payment: Optional[dict]) -> dict:
+    return _field_facts(payment, ("seller_id", "seller", "amount", "order_id"))
+
+def _product_facts(product: Optional[dict]) -> dict:
+    facts = _field_facts(product, ("seller_id", "seller"))
+    if facts["has_seller_id"]:
+        facts["seller_field"] = "seller_id"
+    elif facts["has_seller"]:
+        facts["seller_field"] = "seller"
+    else:
+        facts["seller_field"] = None
+    return facts
+
+async def analyze_database_schema(db: Any) -> dict:
+    """Sample one document per collection and derive the shape facts the dashboards need"""
+    collections = {}
+    for collection_name in await db.list_collection_names():
+        sample_doc = await db[collection_name].find_one()
+        if sample_doc:
+            collections[collection_name] = {
+                "fields": list(sample_doc.keys()),
+                "sample": json.dumps(sample_doc, cls=_JSONEncoder),
+                "document": sample_doc
+            }
+
+    def sample(name: str) -> Optional[dict]:
+        return collections.get(name, {}).get("document")
+
+    return {
+        "collections": collections,
+        "products": _product_facts(sample("products")),
+        "orders": _order_facts(sample("orders")),
+        "payments": _payment_facts(sample("payments")),
+        "analyzed_at": datetime.utcnow()
+    }
+
+def _read_only(value: Any) -> Any:
+    """Freeze the probe result once (all the way down), instead of copying it for every request"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _read_only(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_read_only(item) for item in value)
+    return value
+
+async def refresh(db: Any) -> Mapping[str, Any]:
+    global _schema
+    async with _refresh_lock:
+        _schema = _read_only(await analyze_database_schema(db))
+        logger.info(f"Schema probe refreshed ({len(_schema['collections'])} collections)")
+        return _schema
+
+async def get_schema(db: Any) -> Mapping[str, Any]:
+    """The cached schema facts, read-only (probed on first use if startup did not run)"""
+    schema = _schema
+    if schema is None:
+        schema = await refresh(db)
+    return schema
+
+async def _refresh_loop(db: Any, interval: int):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh(db)
+        except Exception as e:
+            logger.error(f"Schema probe refresh failed: {e}")
+
+async def start(db: Any):
+    """Probe once now and keep the result fresh in the background"""
+    global _refresh_task
+    try:
+        await refresh(db)
+    except Exception as e:
+        logger.error(f"Initial schema probe failed: {e}")
+    if SCHEMA_PROBE_REFRESH_SECONDS > 0 and _refresh_task is None:
+        _refresh_task = asyncio.create_task(_refresh_loop(db, SCHEMA_PROBE_REFRESH_SECONDS))
+
+async def stop():
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
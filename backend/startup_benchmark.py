@@ -0,0 +1,111 @@
+"""
+Cold-start benchmark for the API.
+
+Measures, each in a fresh interpreter:
+
+- the time and peak memory of ``import main``, and which heavy analytics
+  libraries (pandas, numpy, scikit-learn, statsmodels, prophet) were loaded
+  by it -- none should be, they are imported on the first prediction;
+- the time from launching uvicorn until ``/health`` answers (the lifespan
+  startup included), unless ``--import-only`` is given.
+
+    python startup_benchmark.py [--runs 5] [--import-only] [--max-import-seconds 2.0]
+
+With ``--max-import-seconds`` the script exits non-zero when the median
+import time is above the limit or a heavy library was imported eagerly, so it
+can guard against cold-start regressions.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+from urllib.error import URLError
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+HEAVY_MODULES = ("pandas", "numpy", "sklearn", "statsmodels", "prophet", "scipy")
+
+_IMPORT_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "heavy_modules": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+def measure_import() -> dict:
+    """Time `import main` in a new interpreter"""
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_PROBE],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    # The app may log while importing; the probe result is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure_first_request(timeout: float = 60.0) -> float:
+    """Seconds from launching uvicorn until /health returns 200"""
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (URLError, ConnectionError, OSError):
+                time.sleep(0.02)
+        raise TimeoutError(f"/health did not answer within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API cold-start time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-only", action="store_true", help="skip the uvicorn time-to-first-request run")
+    parser.add_argument("--max-import-seconds", type=float, default=None)
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    import_seconds = statistics.median(result["seconds"] for result in imports)
+    max_rss_mb = max(result["max_rss_kb"] for result in imports) / 1024
+    heavy = sorted({name for result in imports for name in result["heavy_modules"]})
+
+    print(f"import main        median {import_seconds * 1000:8.1f} ms over {args.runs} runs")
+    print(f"peak RSS           {max_rss_mb:8.1f} MB")
+    print(f"heavy modules      {', '.join(heavy) or 'none'}")
+
+    if not args.import_only:
+        first_request = [measure_first_request() for _ in range(args.runs)]
+        print(f"first /health      median {statistics.median(first_request) * 1000:8.1f} ms over {args.runs} runs")
+
+    if args.max_import_seconds is not None:
+        if import_seconds > args.max_import_seconds:
+            print(f"FAIL: import took {import_seconds:.2f}s (limit {args.max_import_seconds:.2f}s)")
+            sys.exit(1)
+        if heavy:
+            print(f"FAIL: heavy modules imported at startup: {', '.join(heavy)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
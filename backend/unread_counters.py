@@ -0,0 +1,166 @@
+"""
+Denormalized unread notification counters (``unread_counters``).
+
+One document per user holds the number of unread notifications:
+
+    {"_id": "<user_id>", "notifications": 3}
+
+Notifications are addressed to a single user (see
+``notification_dispatch.py``); any left without a ``user_id`` are counted on
+the ``"*"`` document.  The counters are adjusted with
+``$inc`` by the same code paths that insert notifications or mark them read,
+so the unread badge is a single-document read.  Users without a counter
+document are initialised from ``notifications`` on their first read or first
+increment, so an existing database does not need a rebuild; everything can
+be recomputed with:
+
+    python unread_counters.py --rebuild
+
+(with the API stopped: increments made while it runs are overwritten when the
+rebuilt collection is swapped in).  Unread chat messages are counted per conversation in ``conversations.py``.
+"""
+import sys
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from index_manager import replace_collection
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "unread_counters"
+BROADCAST_KEY = "*"
+
+def _key(user_id: Optional[Any]) -> str:
+    return BROADCAST_KEY if user_id is None else str(user_id)
+
+def _user_id(key: str) -> Optional[str]:
+    return None if key == BROADCAST_KEY else key
+
+async def _increment(db: Any, increments: Dict[str, Dict[str, int]]):
+    """Apply increments; a user's first counter document is seeded from notifications instead.
+
+    The new notifications are already stored, so the seed count includes them.
+    All missing counters are seeded with one aggregation; seeds that lose an
+    insert race to another writer fall back to the increment.
+    """
+    keys = [key for key, fields in increments.items() if fields]
+    if not keys:
+        return
+    existing = {
+        document["_id"]
+        for document in await db[COLLECTION].find({"_id": {"$in": keys}}, {"_id": 1}).to_list(length=None)
+    }
+    seeds = await _count_unread_by_key(db, [key for key in keys if key not in existing])
+    operations = []
+    for key in keys:
+        if key in existing:
+            operations.append(UpdateOne({"_id": key}, {"$inc": increments[key]}, upsert=True))
+        else:
+            operations.append(UpdateOne(
+                {"_id": key},
+                {"$setOnInsert": {"notifications": seeds.get(key, 0)}},
+                upsert=True
+            ))
+    result = await db[COLLECTION].bulk_write(operations, ordered=False)
+
+    raced = [key for index, key in enumerate(keys) if key not in existing and index not in result.upserted_ids]
+    if raced:
+        await db[COLLECTION].bulk_write([
+            UpdateOne({"_id": key}, {"$inc": increments[key]}) for key in raced
+        ], ordered=False)
+
+# Notifications
+
+async def notifications_added(db: Any, notifications: Iterable[dict]):
+    counts = Counter(_key(notification.get("user_id")) for notification in notifications if not notification.get("read"))
+    try:
+        await _increment(db, {key: {"notifications": count} for key, count in counts.items()})
+    except Exception as e:
+        logger.error(f"Error updating notification counters: {e}")
+
+async def notifications_read(db: Any, user_id: Optional[Any], count: int):
+    """Take `count` notifications that just went from unread to read (or were deleted) off the counter"""
+    if count:
+        # No upsert: a missing counter is initialised from notifications, which already reflect this
+        await db[COLLECTION].update_one({"_id": _key(user_id)}, {"$inc": {"notifications": -count}})
+
+async def insert_notification(db: Any, notification: dict):
+    result = await db.notifications.insert_one(notification)
+    await notifications_added(db, [notification])
+    return result
+
+async def insert_notifications(db: Any, notifications: list):
+    result = await db.notifications.insert_many(notifications)
+    await notifications_added(db, notifications)
+    return result
+
+async def _count_unread_by_key(db: Any, keys: List[str]) -> Dict[str, int]:
+    """Unread notification counts for several counter keys, in one aggregation"""
+    if not keys:
+        return {}
+    counts: Dict[str, int] = {}
+    async for row in db.notifications.aggregate([
+        {"$match": {"user_id": {"$in": [_user_id(key) for key in keys]}, "read": False}},
+        {"$group": {"_id": "$user_id", "n": {"$sum": 1}}}
+    ]):
+        key = _key(row["_id"])
+        counts[key] = counts.get(key, 0) + row["n"]
+    return counts
+
+async def _count_notifications(db: Any, user_id: Optional[Any]) -> int:
+    return await db.notifications.count_documents({"user_id": None if user_id is None else str(user_id), "read": False})
+
+# Reads
+
+async def get_counters(db: Any, user_id: Optional[Any]) -> dict:
+    """The user's counter document, initialised from the source collections if it does not exist yet"""
+    key = _key(user_id)
+    document = await db[COLLECTION].find_one({"_id": key})
+    if document is None:
+        initial = {"notifications": await _count_notifications(db, user_id)}
+        # $setOnInsert: increments that raced us in are kept instead of overwritten
+        await db[COLLECTION].update_one({"_id": key}, {"$setOnInsert": initial}, upsert=True)
+        document = await db[COLLECTION].find_one({"_id": key})
+    return document or {}
+
+async def unread_notifications(db: Any, user: dict) -> int:
+    count = (await get_counters(db, user["_id"])).get("notifications", 0)
+    return max(count, 0)
+
+async def reset_notifications(db: Any, user_id: Optional[Any]):
+    await db[COLLECTION].update_one({"_id": _key(user_id)}, {"$set": {"notifications": 0}}, upsert=True)
+
+async def rebuild(db: Any) -> int:
+    """Recompute every counter document from notifications (with notification writes quiesced)"""
+    documents: Dict[str, dict] = {}
+    async for row in db.notifications.aggregate([
+        {"$match": {"read": False}},
+        {"$group": {"_id": "$user_id", "count": {"$sum": 1}}}
+    ]):
+        documents.setdefault(_key(row["_id"]), {"notifications": 0})["notifications"] += row["count"]
+
+    # Swapped in whole, so badges never read an empty collection mid-rebuild
+    await replace_collection(db, COLLECTION, [{"_id": key, **fields} for key, fields in documents.items()])
+    logger.info(f"Rebuilt {COLLECTION} for {len(documents)} users")
+    return len(documents)
+
+async def main():
+    from database import connect_to_mongo, close_mongo_connection
+
+    logging.basicConfig(level=logging.INFO)
+    db = await connect_to_mongo()
+    try:
+        if "--rebuild" in sys.argv[1:]:
+            count = await rebuild(db)
+            print(f"Rebuilt {COLLECTION}: {count} documents")
+        else:
+            print("Usage: python unread_counters.py --rebuild")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+"""
+Linear-trend demand forecasts for many products at once.
+
+Daily completed sales for every product in scope are loaded with one
+aggregation, laid out as dense product x day matrices (days without sales are
+zeros) and every product's trend line is solved in closed form with array
+operations, instead of one query and one regression per product.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+# numpy is imported inside the functions so importing the routers stays cheap
+
+TRAINING_DAYS = 90
+
+async def load_daily_sales(db: Any, match: dict, end_date: datetime, training_days: int = TRAINING_DAYS) -> dict:
+    """Daily quantity/revenue per product for the orders matching `match`.
+
+    `match` filters the order items as well (e.g. ``{"items.seller_id": ...}``).
+    Returns the product ids and two (products x days) matrices covering the
+    `training_days` days up to `end_date`.
+    """
+    import numpy as np
+
+    start_date = datetime(end_date.year, end_date.month, end_date.day) - timedelta(days=training_days - 1)
+    pipeline = [
+        {"$match": {**match, "status": "completed", "created_at": {"$gte": start_date, "$lte": end_date}}},
+        {"$unwind": "$items"},
+        {"$match": match},
+        {
+            "$group": {
+                "_id": {
+                    "product_id": "$items.product_id",
+                    "year": {"$year": "$created_at"},
+                    "month": {"$month": "$created_at"},
+                    "day": {"$dayOfMonth": "$created_at"}
+                },
+                "quantity": {"$sum": "$items.quantity"},
+                "revenue": {"$sum": {"$multiply": ["$items.price", "$items.quantity"]}}
+            }
+        }
+    ]
+    rows = await db.orders.aggregate(pipeline).to_list(length=None)
+
+    product_ids = sorted({str(row["_id"]["product_id"]) for row in rows})
+    positions = {product_id: index for index, product_id in enumerate(product_ids)}
+    quantity = np.zeros((len(product_ids), training_days))
+    revenue = np.zeros((len(product_ids), training_days))
+    for row in rows:
+        key = row["_id"]
+        day = (datetime(key["year"], key["month"], key["day"]) - start_date).days
+        if 0 <= day < training_days:
+            quantity[positions[str(key["product_id"])], day] += row["quantity"] or 0
+            revenue[positions[str(key["product_id"])], day] += row["revenue"] or 0
+
+    return {"product_ids": product_ids, "quantity": quantity, "revenue": revenue}
+
+def fit_trends(series, days: int) -> dict:
+    """Least-squares line through each row of `series`, extrapolated `days` ahead.
+
+    Returns the (rows x days) non-negative predictions and each row's R².
+    """
+    import numpy as np
+
+    series = np.atleast_2d(np.asarray(series, dtype=float))
+    length = series.shape[1]
+    t = np.arange(length, dtype=float)
+    t_centered = t - t.mean()
+
+    means = series.mean(axis=1)
+    slopes = (series - means[:, None]) @ t_centered / (t_centered @ t_centered) if length > 1 else np.zeros(len(series))
+    intercepts = means - slopes * t.mean()
+
+    future = np.arange(length, length + days, dtype=float)
+    predictions = np.maximum(intercepts[:, None] + slopes[:, None] * future, 0)
+
+    fitted = intercepts[:, None] + slopes[:, None] * t
+    ss_res = ((series - fitted) ** 2).sum(axis=1)
+    ss_tot = ((series - means[:, None]) ** 2).sum(axis=1)
+    r2 = np.where(ss_tot > 0, 1 - ss_res / np.where(ss_tot > 0, ss_tot, 1), np.where(ss_res > 0, 0.0, 1.0))
+
+    return {"predictions": predictions, "r2": r2}
+
+def forecast_daily_sales(sales: dict, days: int) -> Dict[str, Any]:
+    """Per-product and total forecasts from `load_daily_sales` output.
+
+    The total is fitted on the summed series, which equals the sum of the
+    product trend lines (least squares is linear in the data).
+    """
+    import numpy as np
+
+    quantity, revenue = sales["quantity"], sales["revenue"]
+    products = len(sales["product_ids"])
+
+    # Rows 0..n-1 are the products, row n is the total
+    stacked_quantity = np.vstack([quantity, quantity.sum(axis=0, keepdims=True)])
+    stacked_revenue = np.vstack([revenue, revenue.sum(axis=0, keepdims=True)])
+    quantity_fit = fit_trends(stacked_quantity, days)
+    revenue_fit = fit_trends(stacked_revenue, days)
+
+    def result(row: int) -> dict:
+        has_sales = stacked_quantity[row].any() or stacked_revenue[row].any()
+        confidence = (quantity_fit["r2"][row] + revenue_fit["r2"][row]) / 2 if has_sales else 0
+        return {
+            "predicted_sales": [round(float(value), 2) for value in quantity_fit["predictions"][row]],
+            "predicted_revenue": [round(float(value), 2) for value in revenue_fit["predictions"][row]],
+            "confidence": round(float(confidence), 2)
+        }
+
+    return {
+        "products": {product_id: result(row) for row, product_id in enumerate(sales["product_ids"])},
+        "total": result(products)
+    }
+
+def empty_forecast(days: int) -> dict:
+    return {"predicted_sales": [0] * days, "predicted_revenue": [0] * days, "confidence": 0}
+
+def forecast_documents(forecasts: Dict[str, dict], sales_versions: Dict[str, int], seller_id: str, days: int, now: datetime) -> list:
+    """`predictions` documents for every product in `sales_versions` (products without sales forecast zero)"""
+    return [{
+        "product_id": product_id,
+        "seller_id": seller_id,
+        "prediction_date": now,
+        "days": days,
+        "sales_version": sales_version,
+        **forecasts.get(product_id, empty_forecast(days)),
+        "created_at": now
+    } for product_id, sales_version in sales_versions.items()]
@@ -0,0 +1,89 @@
+from typing import Any, Dict, Iterable, Optional
+from bson import ObjectId
+
+def to_object_ids(ids: Iterable[Any]) -> list:
+    """Convert a mix of string/ObjectId ids to a de-duplicated list of ObjectIds, skipping invalid ones"""
+    object_ids = []
+    seen = set()
+    for value in ids:
+        if not value:
+            continue
+        key = str(value)
+        if key in seen or not ObjectId.is_valid(key):
+            continue
+        seen.add(key)
+        object_ids.append(value if isinstance(value, ObjectId) else ObjectId(key))
+    return object_ids
+
+async def fetch_by_ids(
+    db: Any,
+    collection: str,
+    ids: Iterable[Any],
+    projection: Optional[Dict[str, int]] = None
+) -> Dict[str, dict]:
+    """Resolve many documents with a single $in query, keyed by their string _id"""
+    object_ids = to_object_ids(ids)
+    if not object_ids:
+        return {}
+
+    docs = await db[collection].find({"_id": {"$in": object_ids}}, projection).to_list(length=None)
+    return {str(doc["_id"]): doc for doc in docs}
+
+async def fetch_users(db: Any, ids: Iterable[Any], fields: Iterable[str]) -> Dict[str, dict]:
+    projection = {field: 1 for field in fields}
+    return await fetch_by_ids(db, "users", ids, projection)
+
+async def fetch_products(db: Any, ids: Iterable[Any], fields: Iterable[str]) -> Dict[str, dict]:
+    projection = {field: 1 for field in fields}
+    return await fetch_by_ids(db, "products", ids, projection)
+
+async def hydrate_orders(db: Any, orders: list) -> list:
+    """Attach user, product and seller summaries to a page of orders using one query per collection"""
+    user_ids = []
+    product_ids = []
+    for order in orders:
+        user_ids.append(order.get("user_id"))
+        for item in order.get("items", []):
+            product_ids.append(item.get("product_id"))
+            user_ids.append(item.get("seller_id"))
+
+    users = await fetch_users(db, user_ids, ["username", "email"])
+    products = await fetch_products(db, product_ids, ["title", "image_url"])
+
+    for order in orders:
+        order["_id"] = str(order["_id"])
+        order["user_id"] = str(order["user_id"])
+
+        # Get user details
+        user = users.get(order["user_id"])
+        if user:
+            order["user"] = {
+                "_id": str(user["_id"]),
+                "username": user["username"],
+                "email": user["email"]
+            }
+
+        # Process items
+        for item in order["items"]:
+            item["product_id"] = str(item["product_id"])
+            item["seller_id"] = str(item["seller_id"])
+
+            # Get product details
+            product = products.get(item["product_id"])
+            if product:
+                item["product"] = {
+                    "_id": str(product["_id"]),
+                    "name": product["title"],
+                    "image_url": product["image_url"]
+                }
+
+            # Get seller details
+            seller = users.get(item["seller_id"])
+            if seller:
+                item["seller"] = {
+                    "_id": str(seller["_id"]),
+                    "username": seller["username"],
+                    "email": seller["email"]
+                }
+
+    return orders
@@ -0,0 +1,62 @@
+"""
+Canonical id types for cross-collection references.
+
+- ``products.seller_id`` is an ObjectId (the user's ``_id``)
+- ``orders.user_id``, ``orders.items.product_id`` and ``orders.items.seller_id``
+  are strings, as written by ``create_order``
+- ``orders.payment_status`` is always present
+- ``notifications.user_id`` is a string (the unread counters are keyed by it)
+
+``db_migration.normalize_references`` converts older documents to these
+types, so every seller query is a single equality match on an indexed field.
+"""
+from typing import Any, Optional
+from bson import ObjectId
+
+def to_object_id(value: Any) -> Optional[ObjectId]:
+    """ObjectId form of an id, or None when it is not a valid ObjectId"""
+    if isinstance(value, ObjectId):
+        return value
+    if value and ObjectId.is_valid(str(value)):
+        return ObjectId(str(value))
+    return None
+
+def seller_products_query(seller_id: Any) -> dict:
+    """Filter for a seller's products"""
+    return {"seller_id": to_object_id(seller_id) or seller_id}
+
+def seller_orders_query(seller_id: Any, settled_only: bool = False) -> dict:
+    """Filter for orders containing a seller's items (prefix of the items.seller_id index)"""
+    query = {"items.seller_id": str(seller_id)}
+    if settled_only:
+        query["payment_status"] = "paid"
+    return query
+
+def normalize_order_refs(order: dict, product_sellers: Optional[dict] = None) -> dict:
+    """Return the $set needed to bring an order's references to the canonical types"""
+    product_sellers = product_sellers or {}
+    updates = {}
+
+    if "user_id" in order and not isinstance(order["user_id"], str):
+        updates["user_id"] = str(order["user_id"])
+
+    items = []
+    items_changed = False
+    for item in order.get("items") or []:
+        item = dict(item)
+        if item.get("product_id") is not None and not isinstance(item["product_id"], str):
+            item["product_id"] = str(item["product_id"])
+            items_changed = True
+        seller_id = item.get("seller_id") or product_sellers.get(str(item.get("product_id")))
+        if seller_id is not None and item.get("seller_id") != str(seller_id):
+            item["seller_id"] = str(seller_id)
+            items_changed = True
+        items.append(item)
+    if items_changed:
+        updates["items"] = items
+
+    # Orders from before payments were tracked always counted as settled
+    if "payment_status" not in order:
+        updates["payment_status"] = "paid"
+
+    return updates
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from typing import Any, Dict, Set
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Held so pending token cleanups are not garbage collected
+_cleanup_tasks: Set[asyncio.Task] = set()
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id: str):
+        super().__init__(f"Not enough stock for product {product_id}")
+        self.product_id = product_id
+
+def _stock_updates(quantities: Dict[str, int], sign: int) -> list:
+    return [
+        UpdateOne(
+            {"_id": ObjectId(product_id)},
+            {"$inc": {"stock": sign * quantity, "sales_count": -sign * quantity}}
+        )
+        for product_id, quantity in quantities.items()
+    ]
+
+async def release_stock(db: Any, quantities: Dict[str, int]):
+    """Put reserved units back (cancelled orders, failed checkouts)"""
+    if quantities:
+        await db.products.bulk_write(_stock_updates(quantities, 1), ordered=False)
+
+async def reserve_stock(db: Any, quantities: Dict[str, int]):
+    """Take `quantity` units of every product, or release what was taken and raise.
+
+    All lines go out in one unordered bulk_write of conditional decrements
+    (stock >= quantity), each tagging the product with a reservation token.
+    When fewer lines match than were sent (not enough stock, or the product is
+    gone), the tagged lines are released with a second bulk_write filtered on
+    the token and InsufficientStock is raised for a line that did not match.
+    This is not isolated: until the compensation has run, other checkouts see
+    the decrements and may fail on them.  Making it all-or-nothing would need a
+    multi-document transaction (replica set).
+    """
+    if not quantities:
+        return
+    token = str(ObjectId())
+    try:
+        result = await db.products.bulk_write([
+            UpdateOne(
+                {"_id": ObjectId(product_id), "stock": {"$gte": quantity}},
+                {"$inc": {"stock": -quantity, "sales_count": quantity}, "$push": {"reservations": token}}
+            )
+            for product_id, quantity in quantities.items()
+        ], ordered=False)
+    except Exception as e:
+        logger.error(f"Stock reservation failed for products {list(quantities)}: {e}")
+        await _release_reserved(db, quantities, token)
+        raise
+
+    if result.matched_count < len(quantities):
+        reserved = {
+            str(product["_id"])
+            for product in await db.products.find(
+                {"_id": {"$in": [ObjectId(product_id) for product_id in quantities]}, "reservations": token},
+                {"_id": 1}
+            ).to_list(length=None)
+        }
+        await _release_reserved(db, quantities, token)
+        raise InsufficientStock(next((product_id for product_id in quantities if product_id not in reserved), next(iter(quantities))))
+
+    # The reservation stands; drop the token off the critical path
+    task = asyncio.create_task(_clear_token(db, quantities, token))
+    _cleanup_tasks.add(task)
+    task.add_done_callback(_cleanup_tasks.discard)
+
+async def _release_reserved(db: Any, quantities: Dict[str, int], token: str):
+    """Put back the lines tagged with `token` (lines that never matched carry no tag, so are skipped)"""
+    try:
+        await db.products.bulk_write([
+            UpdateOne(
+                {"_id": ObjectId(product_id), "reservations": token},
+                {"$inc": {"stock": quantity, "sales_count": -quantity}, "$pull": {"reservations": token}}
+            )
+            for product_id, quantity in quantities.items()
+        ], ordered=False)
+    except Exception as e:
+        logger.error(f"Failed to release stock after a partial reservation {quantities} ({token}): {e}")
+        raise
+
+async def _clear_token(db: Any, quantities: Dict[str, int], token: str):
+    try:
+        await db.products.update_many(
+            {"_id": {"$in": [ObjectId(product_id) for product_id in quantities]}},
+            {"$pull": {"reservations": token}}
+        )
+    except Exception as e:
+        logger.warning(f"Could not clear reservation token {token}: {e}")
@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+Window = Tuple[Optional[datetime], Optional[datetime]]
+
+def shift_month(month_start: datetime, months: int) -> datetime:
+    """First day of the month `months` away from `month_start` (negative goes back)"""
+    index = month_start.year * 12 + (month_start.month - 1) + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def dashboard_windows(today: datetime) -> Dict[str, Window]:
+    """The [start, end) ranges shown on the dashboards, keyed by name"""
+    this_month_start = today.replace(day=1)
+    return {
+        "today": (today, today + timedelta(days=1)),
+        "yesterday": (today - timedelta(days=1), today),
+        "this_month": (this_month_start, shift_month(this_month_start, 1)),
+        "last_month": (shift_month(this_month_start, -1), this_month_start),
+        "total": (None, None)
+    }
+
+def _items_expr(seller_id: Optional[str]) -> dict:
+    items = {"$ifNull": ["$items", []]}
+    if not seller_id:
+        return items
+    return {"$filter": {"input": items, "as": "item", "cond": {"$eq": ["$$item.seller_id", seller_id]}}}
+
+def _created_range(start: Optional[datetime], end: Optional[datetime]) -> dict:
+    created = {}
+    if start:
+        created["$gte"] = start
+    if end:
+        created["$lt"] = end
+    return {"created_at": created} if created else {}
+
+_TOTALS = {
+    "orders": {"$sum": 1},
+    "revenue": {"$sum": "$revenue"},
+    "completed_orders": {"$sum": {"$cond": ["$completed", 1, 0]}},
+    "completed_revenue": {"$sum": {"$cond": ["$completed", "$revenue", 0]}}
+}
+
+def _empty_totals() -> dict:
+    return {field: 0 for field in _TOTALS}
+
+async def aggregate_order_windows(
+    db: Any,
+    windows: Dict[str, Window],
+    match: Optional[dict] = None,
+    seller_id: Optional[str] = None,
+    months: int = 6,
+    top_products: int = 0,
+    completed_status: str = "completed"
+) -> dict:
+    """Order counts and item revenue for every window, the monthly trend and the
+    best-selling products, computed in a single $facet aggregation over orders.
+
+    When `seller_id` is given only that seller's items count towards revenue.
+    Every bucket reports all orders and, separately, orders in `completed_status`.
+    """
+    now = datetime.utcnow()
+    first_month = shift_month(datetime(now.year, now.month, 1), -(months - 1))
+
+    facets = {
+        name: [
+            {"$match": _created_range(start, end)},
+            {"$group": {"_id": None, **_TOTALS}}
+        ]
+        for name, (start, end) in windows.items()
+    }
+    facets["monthly"] = [
+        {"$match": {"created_at": {"$gte": first_month}}},
+        {"$group": {
+            "_id": {"year": {"$year": "$created_at"}, "month": {"$month": "$created_at"}},
+            **_TOTALS
+        }}
+    ]
+    if top_products:
+        facets["top_products"] = [
+            {"$match": {"completed": True}},
+            {"$unwind": "$items"},
+            {"$group": {
+                "_id": "$items.product_id",
+                "total_quantity": {"$sum": "$items.quantity"},
+                "total_revenue": {"$sum": {"$multiply": ["$items.price", "$items.quantity"]}}
+            }},
+            {"$sort": {"total_revenue": -1}},
+            {"$limit": top_products}
+        ]
+
+    pipeline = [
+        {"$match": match or {}},
+        {"$project": {"created_at": 1, "status": 1, "items": _items_expr(seller_id)}},
+        {"$addFields": {
+            "revenue": {"$sum": {"$map": {
+                "input": "$items",
+                "as": "item",
+                "in": {"$multiply": [{"$ifNull": ["$$item.price", 0]}, {"$ifNull": ["$$item.quantity", 0]}]}
+            }}},
+            "completed": {"$eq": ["$status", completed_status]}
+        }},
+        {"$facet": facets}
+    ]
+
+    rows = await db.orders.aggregate(pipeline).to_list(length=None)
+    result = rows[0] if rows else {}
+
+    totals = {}
+    for name in windows:
+        bucket = result.get(name) or [{}]
+        totals[name] = {field: bucket[0].get(field, 0) for field in _TOTALS}
+
+    by_month = {(row["_id"]["year"], row["_id"]["month"]): row for row in result.get("monthly", [])}
+    monthly = []
+    for i in range(months):
+        month_start = shift_month(first_month, i)
+        row = by_month.get((month_start.year, month_start.month))
+        monthly.append({
+            "month_start": month_start,
+            **({field: row[field] for field in _TOTALS} if row else _empty_totals())
+        })
+
+    return {
+        "windows": totals,
+        "monthly": monthly,
+        "top_products": result.get("top_products", [])
+    }
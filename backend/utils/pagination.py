@@ -0,0 +1,83 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional
+from bson import ObjectId
+from fastapi import HTTPException, Response, status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def _encode_value(value: Any) -> list:
+    if isinstance(value, datetime):
+        return ["d", value.isoformat()]
+    if isinstance(value, ObjectId):
+        return ["o", str(value)]
+    return ["v", value]
+
+def _decode_value(encoded: list) -> Any:
+    kind, value = encoded
+    if kind == "d":
+        return datetime.fromisoformat(value)
+    if kind == "o":
+        return ObjectId(value)
+    return value
+
+def encode_cursor(doc: dict, sort_field: str, direction: int) -> str:
+    """Opaque cursor pointing just past `doc` in a (sort_field, _id) ordering"""
+    payload = {
+        "f": sort_field,
+        "d": direction,
+        "v": _encode_value(doc.get(sort_field)),
+        "id": str(doc["_id"])
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort_field: str, direction: int) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if payload["f"] != sort_field or payload["d"] != direction:
+            raise ValueError("cursor was issued for a different sort order")
+        return _decode_value(payload["v"]), ObjectId(payload["id"])
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+def keyset_query(query: dict, cursor: Optional[str], sort_field: str, direction: int = -1) -> dict:
+    """Restrict `query` to documents after `cursor` in (sort_field, _id) order"""
+    if not cursor:
+        return query
+
+    value, last_id = decode_cursor(cursor, sort_field, direction)
+    op = "$lt" if direction < 0 else "$gt"
+
+    # Missing/null sort values order below everything else in MongoDB
+    if value is None:
+        after = [{sort_field: None, "_id": {op: last_id}}]
+        if direction > 0:
+            after.append({sort_field: {"$ne": None}})
+    else:
+        after = [
+            {sort_field: {op: value}},
+            {sort_field: value, "_id": {op: last_id}}
+        ]
+        if direction < 0:
+            after.append({sort_field: None})
+
+    keyset = {"$or": after}
+    return {"$and": [query, keyset]} if query else keyset
+
+def sort_keys(sort_field: str, direction: int = -1) -> list:
+    """Sort specification with _id as tie-breaker so pages are stable"""
+    return [(sort_field, direction), ("_id", direction)]
+
+def set_next_cursor(response: Response, docs: list, limit: int, sort_field: str, direction: int = -1) -> Optional[str]:
+    """Expose the cursor for the following page (only when this page was full)"""
+    if not docs or len(docs) < limit:
+        return None
+    next_cursor = encode_cursor(docs[-1], sort_field, direction)
+    response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return next_cursor
@@ -0,0 +1,244 @@
+"""
+Product search on top of a weighted MongoDB text index.
+
+Whole-word matches go through ``$text`` (stemmed, relevance scored) and
+search-as-you-type prefixes through the ``search_terms`` array, which holds the
+lower-cased tokens of each product's title, brand, category and tags.  Ranked
+search lists the ``$text`` hits by score first and only then, when there are
+too few of them, the remaining prefix matches (most viewed first).  Both
+queries are index backed, so search cost follows the number of matches rather
+than the size of the catalog.  ``search_terms`` is kept up to date by the
+product write paths and backfilled by the migration.
+"""
+import re
+import logging
+from typing import Any, List, Optional
+
+from pymongo import UpdateOne
+
+from index_manager import declare_index, declare_query
+
+logger = logging.getLogger(__name__)
+
+TEXT_INDEX_NAME = "product_text_search"
+TEXT_INDEX_WEIGHTS = {"title": 10, "brand": 5, "category": 5, "tags": 3, "description": 1}
+TERM_FIELDS = ("title", "brand", "category")
+PRICE_BUCKETS = [0, 25, 50, 100, 200, 500]
+MAX_QUERY_TOKENS = 8
+BACKFILL_BATCH_SIZE = 500
+
+declare_index("products", "search_terms")
+declare_query("product prefix search", "products", {"search_terms": {"$all": [re.compile("^foot")]}})
+declare_query("product text search", "products", {"$text": {"$search": "football"}})
+
+_TOKEN_RE = re.compile(r"[\w]+", re.UNICODE)
+
+def tokenize(text: Any) -> List[str]:
+    """Lower-cased word tokens of a string"""
+    if not text:
+        return []
+    return _TOKEN_RE.findall(str(text).lower())
+
+def build_search_terms(product: dict) -> List[str]:
+    """Tokens stored on the product for prefix/autocomplete matching"""
+    terms = set()
+    for field in TERM_FIELDS:
+        terms.update(tokenize(product.get(field)))
+    for tag in product.get("tags") or []:
+        terms.update(tokenize(tag))
+    return sorted(terms)
+
+def prefix_filter(search: str) -> Optional[dict]:
+    """Every query token must prefix one of the product's terms (anchored, so it can use the index)"""
+    tokens = tokenize(search)[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return None
+    return {"search_terms": {"$all": [re.compile("^" + re.escape(token)) for token in tokens]}}
+
+def search_filter(search: Optional[str]) -> dict:
+    """Match products by full-text relevance or by token prefix"""
+    if not search or not search.strip():
+        return {}
+    text = {"$text": {"$search": search}}
+    prefix = prefix_filter(search)
+    # $text may sit inside $or because every branch is indexed
+    return {"$or": [text, prefix]} if prefix else text
+
+def facet_filters(
+    category: Optional[str] = None,
+    brand: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: Optional[bool] = None
+) -> dict:
+    """Query clauses for the facet filters shared by listing, search and facet counts"""
+    query = {}
+    if category:
+        query["category"] = category
+    if brand:
+        query["brand"] = brand
+
+    price_query = {}
+    if min_price is not None:
+        price_query["$gte"] = min_price
+    if max_price is not None:
+        price_query["$lte"] = max_price
+    if price_query:
+        query["price"] = price_query
+
+    if in_stock:
+        query["stock"] = {"$gt": 0}
+    return query
+
+def build_query(search: Optional[str], filters: Optional[dict] = None) -> dict:
+    query = dict(filters or {})
+    query.update(search_filter(search))
+    return query
+
+def relevance_sort() -> list:
+    """Best text matches first, newest first among equal scores"""
+    return [("score", {"$meta": "textScore"}), ("created_at", -1), ("_id", -1)]
+
+def prefix_sort() -> list:
+    """Prefix-only matches have no text score: most viewed first"""
+    return [("views_count", -1), ("_id", -1)]
+
+async def search_products(
+    db: Any,
+    search: str,
+    filters: Optional[dict] = None,
+    skip: int = 0,
+    limit: int = 20,
+    projection: Optional[dict] = None
+) -> list:
+    """Products matching `search` and `filters`: text matches by relevance, then prefix-only matches"""
+    filters = dict(filters or {})
+    if not search or not search.strip():
+        return await db.products.find(filters, projection).sort([("created_at", -1), ("_id", -1)]).skip(skip).limit(limit).to_list(length=None)
+
+    text_projection = dict(projection or {})
+    text_projection["score"] = {"$meta": "textScore"}
+    wanted = skip + limit
+    text_hits = await db.products.find(
+        {**filters, "$text": {"$search": search}}, text_projection
+    ).sort(relevance_sort()).limit(wanted).to_list(length=None)
+    results = text_hits[skip:wanted]
+
+    # Fewer text hits than the page reaches: every one of them is in text_hits, so the
+    # prefix fallback can exclude them and continue the ranking where they stop
+    prefix = prefix_filter(search)
+    if prefix and len(text_hits) < wanted:
+        results += await db.products.find(
+            {**filters, **prefix, "_id": {"$nin": [product["_id"] for product in text_hits]}}, projection
+        ).sort(prefix_sort()).skip(max(0, skip - len(text_hits))).limit(limit - len(results)).to_list(length=None)
+
+    for product in results:
+        product.pop("score", None)
+    return results
+
+async def autocomplete(db: Any, prefix: str, limit: int = 10) -> list:
+    """Product title suggestions for a partially typed query"""
+    query = prefix_filter(prefix)
+    if not query:
+        return []
+    products = await db.products.find(
+        query, {"title": 1, "category": 1, "brand": 1, "price": 1, "image_url": 1}
+    ).sort([("views_count", -1), ("_id", -1)]).limit(limit).to_list(length=None)
+
+    for product in products:
+        product["id"] = str(product.pop("_id"))
+    return products
+
+async def search_facets(db: Any, search: Optional[str], filters: Optional[dict] = None) -> dict:
+    """Counts per category, brand, price range and stock state for the current result set"""
+    pipeline = [
+        {"$match": build_query(search, filters)},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "category": [
+                {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}}
+            ],
+            "brand": [
+                {"$match": {"brand": {"$nin": [None, ""]}}},
+                {"$group": {"_id": "$brand", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}}
+            ],
+            "price": [
+                {"$bucket": {
+                    "groupBy": "$price",
+                    "boundaries": PRICE_BUCKETS,
+                    "default": f"{PRICE_BUCKETS[-1]}+",
+                    "output": {"count": {"$sum": 1}}
+                }}
+            ],
+            "in_stock": [
+                {"$group": {"_id": {"$gt": ["$stock", 0]}, "count": {"$sum": 1}}}
+            ]
+        }}
+    ]
+    rows = await db.products.aggregate(pipeline).to_list(length=None)
+    facets = rows[0] if rows else {}
+
+    def counts(key: str) -> list:
+        return [{"value": row["_id"], "count": row["count"]} for row in facets.get(key, [])]
+
+    price_ranges = []
+    for row in facets.get("price", []):
+        lower = row["_id"]
+        if isinstance(lower, str):
+            price_ranges.append({"min": PRICE_BUCKETS[-1], "max": None, "count": row["count"]})
+        else:
+            upper = PRICE_BUCKETS[PRICE_BUCKETS.index(lower) + 1]
+            price_ranges.append({"min": lower, "max": upper, "count": row["count"]})
+
+    stock = {str(row["_id"]).lower(): row["count"] for row in facets.get("in_stock", [])}
+    total = facets.get("total") or [{"count": 0}]
+
+    return {
+        "total": total[0]["count"],
+        "category": counts("category"),
+        "brand": counts("brand"),
+        "price": price_ranges,
+        "in_stock": {"true": stock.get("true", 0), "false": stock.get("false", 0)}
+    }
+
+async def ensure_search_indexes(db: Any):
+    """Replace any other products text index (only one is allowed) with the weighted search index.
+
+    Text indexes are created here rather than declared, because an existing text
+    index with other fields or weights has to be dropped first.
+    """
+    indexes = await db.products.index_information()
+    for name, info in indexes.items():
+        is_text = any(kind == "text" for _, kind in info.get("key", []))
+        if is_text and name != TEXT_INDEX_NAME:
+            await db.products.drop_index(name)
+            logger.info(f"Dropped products text index {name}")
+
+    await db.products.create_index(
+        [(field, "text") for field in TEXT_INDEX_WEIGHTS],
+        name=TEXT_INDEX_NAME,
+        weights=TEXT_INDEX_WEIGHTS,
+        default_language="english"
+    )
+
+async def backfill_search_terms(db: Any) -> int:
+    """Store search_terms on products that predate them"""
+    products = db.products.find({"search_terms": {"$exists": False}}, {field: 1 for field in (*TERM_FIELDS, "tags")})
+
+    operations = []
+    updated = 0
+    async for product in products:
+        operations.append(UpdateOne({"_id": product["_id"]}, {"$set": {"search_terms": build_search_terms(product)}}))
+        if len(operations) >= BACKFILL_BATCH_SIZE:
+            await db.products.bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+    if operations:
+        await db.products.bulk_write(operations, ordered=False)
+        updated += len(operations)
+
+    if updated:
+        logger.info(f"Backfilled search_terms on {updated} products")
+    return updated
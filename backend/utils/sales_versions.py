@@ -0,0 +1,68 @@
+"""
+Sales data versions for products and sellers.
+
+Every order write that can change sales figures (new order, status change,
+payment) bumps a counter for each product in the order and for each of its
+sellers.  Stored predictions record the version they were computed from and
+are served until it changes (or they reach PREDICTION_CACHE_MAX_AGE_SECONDS,
+since a forecast's window moves with the calendar even without new orders).
+"""
+import logging
+from typing import Any, Dict, Iterable
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "sales_versions"
+
+def _key(kind: str, entity_id: Any) -> str:
+    return f"{kind}:{entity_id}"
+
+def order_keys(order: dict) -> set:
+    keys = set()
+    for item in order.get("items", []):
+        if item.get("product_id"):
+            keys.add(_key("product", item["product_id"]))
+        if item.get("seller_id"):
+            keys.add(_key("seller", item["seller_id"]))
+    return keys
+
+BUMP_ATTEMPTS = 2
+
+async def bump_sales_versions(db: Any, order: dict):
+    """Invalidate cached predictions for the order's products and sellers; never fails the caller's write.
+
+    A bump that fails even after a retry is logged with its keys: those
+    predictions stay stale until PREDICTION_CACHE_MAX_AGE_SECONDS expires them.
+    """
+    keys = order_keys(order)
+    if not keys:
+        return
+    operations = [
+        UpdateOne({"_id": key}, {"$inc": {"version": 1}, "$currentDate": {"updated_at": True}}, upsert=True)
+        for key in sorted(keys)
+    ]
+    for attempt in range(1, BUMP_ATTEMPTS + 1):
+        try:
+            await db[COLLECTION].bulk_write(operations, ordered=False)
+            return
+        except Exception as e:
+            if attempt == BUMP_ATTEMPTS:
+                logger.exception(
+                    f"Could not bump sales versions {sorted(keys)} for order {order.get('_id')}; "
+                    f"their cached predictions are stale until they expire: {e}"
+                )
+
+async def get_sales_versions(db: Any, kind: str, entity_ids: Iterable[Any]) -> Dict[str, int]:
+    """Current version of each product/seller id (0 until its first order write)"""
+    entity_ids = [str(entity_id) for entity_id in entity_ids]
+    documents = await db[COLLECTION].find(
+        {"_id": {"$in": [_key(kind, entity_id) for entity_id in entity_ids]}}
+    ).to_list(length=None)
+    versions = {document["_id"].split(":", 1)[1]: document.get("version", 0) for document in documents}
+    return {entity_id: versions.get(entity_id, 0) for entity_id in entity_ids}
+
+async def get_sales_version(db: Any, kind: str, entity_id: Any) -> int:
+    document = await db[COLLECTION].find_one({"_id": _key(kind, entity_id)})
+    return document.get("version", 0) if document else 0
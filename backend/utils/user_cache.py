@@ -0,0 +1,90 @@
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from bson import ObjectId
+
+from config import USER_CACHE_MAX_SIZE, USER_CACHE_TTL_SECONDS
+
+class UserCache:
+    """Bounded LRU cache of user documents with a per-entry TTL.
+
+    Entries are invalidated explicitly on user writes in this process; the TTL
+    bounds how stale a principal can be when another worker made the change.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str) -> Optional[dict]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        # Callers are free to mutate the principal they get back
+        return copy.deepcopy(user)
+
+    def set(self, user_id: str, user: dict):
+        if self.max_size <= 0:
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(user))
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: Any):
+        if self._entries.pop(str(user_id), None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+user_cache = UserCache(USER_CACHE_MAX_SIZE, USER_CACHE_TTL_SECONDS)
+
+async def load_user(db: Any, user_id: str) -> Optional[dict]:
+    """Return the user document for an authenticated principal, using the cache when possible"""
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    user = await db.users.find_one({"_id": ObjectId(user_id)})
+    if user is None:
+        return None
+
+    # Convert ObjectId to string
+    user["_id"] = str(user["_id"])
+    user_cache.set(user_id, user)
+    return user
+
+def invalidate_user(user_id: Any):
+    """Drop a cached principal after the user document changed"""
+    user_cache.invalidate(user_id)
@@ -1,98 +1,254 @@
+"""
+WebSocket connection registry with concurrent, bounded fan-out.
+
+Connections are indexed by user and by room (sets, so joins and disconnects
+are O(1)).  Every connection owns a bounded send queue drained by its own
+writer task: a broadcast serializes the payload once and only enqueues it, so
+one slow client never holds up delivery to the others.  A client whose queue
+fills up, or whose send does not complete within ``WS_SEND_TIMEOUT_SECONDS``,
+is treated as a slow consumer and disconnected.
+
+Sends addressed to a user, a room or everyone are published through the
+configured broker (``message_broker.py``) and delivered by every process to
+the sockets it holds, so recipients connected to another worker get them too.
+A batch of notifications for many users travels as a single message.
+Without a broker (before ``start``) delivery is local only.
+
+Server-Sent Events clients register a stream connection (``connect_stream``):
+it is indexed and fanned out to like a socket, but its queue is drained by
+the SSE response instead of a writer task.  Notifications without a
+``user_id`` go to ``ADMIN_ROOM``, which every superadmin connection joins.
+"""
 import asyncio
-from typing import Dict, List, Any
-from fastapi import WebSocket
 import json
+import logging
 from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Set, Union
+
+from fastapi import WebSocket
+
+from config import WS_SEND_QUEUE_SIZE, WS_SEND_TIMEOUT_SECONDS
+from message_broker import Broker
+
+logger = logging.getLogger(__name__)
+
+# Close code for clients dropped because they could not keep up ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+GOING_AWAY_CLOSE_CODE = 1001
+
+# Every superadmin connection (socket or stream) joins this room
+ADMIN_ROOM = "superadmins"
+
+Message = Union[str, Dict[str, Any]]
+
+def serialize(message: Message) -> str:
+    return message if isinstance(message, str) else json.dumps(message, default=str)
+
+class Connection:
+    """One accepted socket (or SSE stream, when `websocket` is None), its rooms and its outgoing queue"""
+
+    def __init__(self, websocket: Optional[WebSocket], user_id: Optional[str], queue_size: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.rooms: Set[str] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.connected_at = datetime.utcnow()
+        self.writer: Optional[asyncio.Task] = None
+        self.closed = False
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, List[Dict[str, Any]]] = {}
-        self.user_connections: Dict[str, List[WebSocket]] = {}
+    def __init__(self, queue_size: int = WS_SEND_QUEUE_SIZE, send_timeout: float = WS_SEND_TIMEOUT_SECONDS):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.rooms: Dict[str, Set[Connection]] = {}
+        self.user_connections: Dict[str, Set[Connection]] = {}
+        # Keyed by the WebSocket, or by the Connection itself for SSE streams
+        self._connections: Dict[Any, Connection] = {}
+        self.dropped_slow_consumers = 0
+        self.broker: Optional[Broker] = None
+
+    async def start(self, broker: Broker):
+        self.broker = broker
+        await broker.subscribe(self.deliver)
 
-    async def connect(self, websocket: WebSocket, room_id: str, user_id: str = None):
+    async def stop(self):
+        if self.broker is not None:
+            await self.broker.unsubscribe(self.deliver)
+            self.broker = None
+
+    async def connect(self, websocket: WebSocket, user_id: Optional[str] = None, rooms: Iterable[str] = ()) -> Connection:
         await websocket.accept()
-        
-        # Add to room connections
-        if room_id not in self.active_connections:
-            self.active_connections[room_id] = []
-        
-        connection_info = {
-            "websocket": websocket,
-            "user_id": user_id,
-            "connected_at": datetime.utcnow()
-        }
-        
-        self.active_connections[room_id].append(connection_info)
-        
-        # Add to user connections
-        if user_id:
-            if user_id not in self.user_connections:
-                self.user_connections[user_id] = []
-            self.user_connections[user_id].append(websocket)
-        
-        # Notify room about new connection
-        if user_id:
-            await self.broadcast_to_room(
-                room_id,
-                {
-                    "type": "system",
-                    "content": f"User {user_id} joined the room",
-                    "timestamp": datetime.utcnow().isoformat()
-                },
-                exclude_user=None  # Include all users
-            )
-
-    def disconnect(self, websocket: WebSocket, room_id: str, user_id: str = None):
-        # Remove from room connections
-        if room_id in self.active_connections:
-            self.active_connections[room_id] = [
-                conn for conn in self.active_connections[room_id] 
-                if conn["websocket"] != websocket
-            ]
-            
-            if not self.active_connections[room_id]:
-                del self.active_connections[room_id]
-        
-        # Remove from user connections
-        if user_id and user_id in self.user_connections:
-            self.user_connections[user_id] = [
-                conn for conn in self.user_connections[user_id] 
-                if conn != websocket
-            ]
-            
-            if not self.user_connections[user_id]:
-                del self.user_connections[user_id]
-    
-    async def broadcast_to_room(self, room_id: str, message: Dict[str, Any], exclude_user: str = None):
-        if room_id in self.active_connections:
-            for connection in self.active_connections[room_id]:
-                if exclude_user and connection["user_id"] == exclude_user:
-                    continue
-                
-                await connection["websocket"].send_text(json.dumps(message))
-    
-    async def send_personal_message(self, user_id: str, message: Dict[str, Any]):
-        if user_id in self.user_connections:
-            for websocket in self.user_connections[user_id]:
-                await websocket.send_text(json.dumps(message))
-    
+        connection = Connection(websocket, user_id, self.queue_size)
+        connection.writer = asyncio.create_task(self._write(connection))
+        self._register(websocket, connection, rooms)
+        return connection
+
+    def connect_stream(self, user_id: Optional[str] = None, rooms: Iterable[str] = ()) -> Connection:
+        """Register an SSE stream; the caller reads `connection.queue` (None marks the end of the stream)"""
+        connection = Connection(None, user_id, self.queue_size)
+        self._register(connection, connection, rooms)
+        return connection
+
+    def _register(self, key: Any, connection: Connection, rooms: Iterable[str]):
+        self._connections[key] = connection
+        if connection.user_id:
+            self.user_connections.setdefault(connection.user_id, set()).add(connection)
+        for room_id in rooms:
+            self.join(connection, room_id)
+
+    def join(self, connection: Connection, room_id: str):
+        connection.rooms.add(room_id)
+        self.rooms.setdefault(room_id, set()).add(connection)
+
+    def leave(self, connection: Connection, room_id: str):
+        connection.rooms.discard(room_id)
+        members = self.rooms.get(room_id)
+        if members is not None:
+            members.discard(connection)
+            if not members:
+                del self.rooms[room_id]
+
+    def disconnect(self, websocket: Union[WebSocket, Connection]):
+        """Forget a socket (or an SSE stream's Connection)"""
+        connection = self._connections.pop(websocket, None)
+        if connection is None:
+            return
+        connection.closed = True
+        for room_id in list(connection.rooms):
+            self.leave(connection, room_id)
+        if connection.user_id:
+            user_sockets = self.user_connections.get(connection.user_id)
+            if user_sockets is not None:
+                user_sockets.discard(connection)
+                if not user_sockets:
+                    del self.user_connections[connection.user_id]
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        if connection.websocket is None:
+            # Wake the SSE response so it ends the stream
+            try:
+                connection.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+
+    def _drop(self, connection: Connection, reason: str):
+        if connection.closed:
+            return
+        self.dropped_slow_consumers += 1
+        if connection.websocket is None:
+            logger.warning(f"Dropping event stream of user {connection.user_id}: {reason}")
+            self.disconnect(connection)
+            return
+        logger.warning(f"Dropping WebSocket of user {connection.user_id}: {reason}")
+        self.disconnect(connection.websocket)
+        asyncio.create_task(self._close(connection.websocket, SLOW_CONSUMER_CLOSE_CODE))
+
+    async def _close(self, websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            # Already closed by the client
+            pass
+
+    async def _write(self, connection: Connection):
+        while True:
+            text = await connection.queue.get()
+            try:
+                await asyncio.wait_for(connection.websocket.send_text(text), timeout=self.send_timeout)
+            except asyncio.TimeoutError:
+                self._drop(connection, f"send took longer than {self.send_timeout}s")
+                return
+            except Exception as e:
+                # The socket went away; the receive loop will see the disconnect too
+                self.disconnect(connection.websocket)
+                logger.info(f"WebSocket send to user {connection.user_id} failed: {e}")
+                return
+
+    def _enqueue(self, connections: Iterable[Connection], text: str, exclude_user: Optional[str] = None) -> int:
+        delivered = 0
+        for connection in list(connections):
+            if connection.closed or (exclude_user and connection.user_id == exclude_user):
+                continue
+            try:
+                connection.queue.put_nowait(text)
+                delivered += 1
+            except asyncio.QueueFull:
+                self._drop(connection, f"send queue full ({self.queue_size} messages)")
+        return delivered
+
+    def send(self, connection: Connection, message: Message) -> int:
+        """Queue a message for one connection of this process"""
+        return self._enqueue([connection], serialize(message))
+
+    async def deliver(self, envelope: Dict[str, Any]):
+        """Broker handler: queue a published message for the matching local sockets"""
+        target, key = envelope["target"], envelope.get("key")
+        if target == "users":
+            # One envelope for many recipients: [user_id, payload] pairs, fanned out here
+            for user_id, payload in envelope["payload"]:
+                self._enqueue(self.user_connections.get(user_id, ()), payload)
+            return
+        if target == "user":
+            connections = self.user_connections.get(key, ())
+        elif target == "room":
+            connections = self.rooms.get(key, ())
+        else:
+            connections = self._connections.values()
+        self._enqueue(connections, envelope["payload"], envelope.get("exclude_user"))
+
+    async def _publish(self, target: str, key: Optional[str], message: Message, exclude_user: Optional[str] = None):
+        await self._send_envelope({"target": target, "key": key, "payload": serialize(message), "exclude_user": exclude_user})
+
+    async def _send_envelope(self, envelope: Dict[str, Any]):
+        if self.broker is None:
+            await self.deliver(envelope)
+        else:
+            await self.broker.publish(envelope)
+
+    async def send_personal_message(self, user_id: str, message: Message):
+        """Send to every socket of a user, on any process"""
+        await self._publish("user", user_id, message)
+
+    async def broadcast_to_room(self, room_id: str, message: Message, exclude_user: Optional[str] = None):
+        await self._publish("room", room_id, message, exclude_user)
+
     async def broadcast_notification(self, notification: Dict[str, Any]):
+        """Push to the recipient's connections; notifications without a user_id go to the connected superadmins"""
+        message = {"type": "notification", "data": notification}
         target_user_id = notification.get("user_id")
-        
-        # If notification is for a specific user
         if target_user_id:
-            await self.send_personal_message(target_user_id, {
-                "type": "notification",
-                "data": notification
-            })
-        # If notification is for all users (superadmins)
+            await self._publish("user", str(target_user_id), message)
         else:
-            for user_id, connections in self.user_connections.items():
-                # Check if user is superadmin (this would require a database lookup)
-                # For simplicity, we're sending to all users here
-                for websocket in connections:
-                    await websocket.send_text(json.dumps({
-                        "type": "notification",
-                        "data": notification
-                    }))
+            await self._publish("room", ADMIN_ROOM, message)
+
+    async def broadcast_notifications(self, notifications: Iterable[Dict[str, Any]]):
+        """Push many addressed notifications with one published message; each process fans it out locally"""
+        payload = [
+            [str(notification["user_id"]), serialize({"type": "notification", "data": notification})]
+            for notification in notifications
+        ]
+        if payload:
+            await self._send_envelope({"target": "users", "key": None, "payload": payload})
+
+    def is_connected(self, user_id: str) -> bool:
+        """Whether the user has a socket on this process"""
+        return bool(self.user_connections.get(user_id))
+
+    async def close_all(self):
+        for key, connection in list(self._connections.items()):
+            self.disconnect(key)
+            if connection.websocket is not None:
+                await self._close(connection.websocket, GOING_AWAY_CLOSE_CODE)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": len(self._connections),
+            "streams": sum(1 for connection in self._connections.values() if connection.websocket is None),
+            "users": len(self.user_connections),
+            "rooms": {room_id: len(members) for room_id, members in self.rooms.items()},
+            "queued_messages": sum(connection.queue.qsize() for connection in self._connections.values()),
+            "dropped_slow_consumers": self.dropped_slow_consumers
+        }
 
+# The process-wide registry used by the chat socket and notification dispatch
+manager = ConnectionManager()